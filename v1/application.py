@@ -1,9 +1,5 @@
-import yaml
-
 from gi.repository import Gtk, Gdk
 
-from assemblers.frisc_assembler import *
-from gui_components.editor_component import *
 from utils.gui_helpers import *
 
 
@@ -14,9 +10,7 @@ class PEAS(Gtk.Application):
     def __init__(self):
         Gtk.Application.__init__(self, application_id="io.github.zjurelinac.PEAS")
         self.connect("activate", self.on_application_activate)
-        self.editor = EditorComponent()
-        self.simulator = Gtk.Label('Simulator')
-        self.loader = Gtk.Label('Loader')
+        self.components = {}
 
     def init_user_interface(self):
         self.window = Gtk.ApplicationWindow(title="PEAS", type=Gtk.WindowType.TOPLEVEL)
@@ -24,9 +18,10 @@ class PEAS(Gtk.Application):
         self.window.set_default_size(1080, 700)
         self.window.set_icon_from_file('resources/app.svg')
         self.views = Gtk.Stack()
-        self.views.add_titled(self.editor, 'editor', 'Editor')
-        self.views.add_titled(self.simulator, 'simulator', 'Simulator')
-        self.views.add_titled(self.loader, 'loader', 'Loader')
+        for name, title in [('editor', 'Editor'), ('simulator', 'Simulator'), ('loader', 'Loader')]:
+            self.views.add_titled(Gtk.Box(), name, title)
+        self.views.connect('notify::visible-child-name', self.on_view_changed)
+        self.get_component('editor')
         self.init_header_bar()
         self.window.set_titlebar(self.header_bar)
         self.window.add(self.views)
@@ -47,21 +42,50 @@ class PEAS(Gtk.Application):
         menuButton.set_name('icon_button')
         self.header_bar.pack_end(menuButton)
 
+    def get_component(self, name):
+        """Return the component of a view, building it when first used
+
+        Components and the modules behind them are only loaded on first use,
+        so that starting the application builds only the editor."""
+        if name not in self.components:
+            if name == 'editor':
+                from gui_components.editor_component import EditorComponent
+                component = EditorComponent()
+            elif name == 'simulator':
+                from gui_components.simulator_component import SimulatorComponent
+                component = SimulatorComponent()
+            else:
+                component = Gtk.Label('Loader')
+
+            self.views.get_child_by_name(name).pack_start(component, True, True, 0)
+            component.show_all()
+            self.components[name] = component
+        return self.components[name]
+
     # Actions
 
     def assemble_source(self):
         pass
 
-    def start_simulator(self):
-        pass
+    def start_simulator(self, p_file_name):
+        from simulators.frisc_simulator import FRISCSimulator
+
+        simulator = FRISCSimulator(65536)
+        simulator.load(p_file_name)
+        self.get_component('simulator').set_simulator(simulator)
+        self.views.set_visible_child_name('simulator')
 
     # Events
 
     def on_application_activate(self, data):
         self.init_user_interface()
 
+    def on_view_changed(self, stack, data):
+        self.get_component(stack.get_visible_child_name())
+
     def on_quit(self):
-        pass
+        if 'simulator' in self.components:
+            self.components['simulator'].stop()
 
 
 if __name__ == '__main__':
@@ -37,3 +37,28 @@ class Assembler(metaclass=ABCMeta):
         returns a (message, success) pair
         """
         pass
+
+
+class AssemblyResult:
+    """Result of assembling source code in memory
+
+    Holds the memory image as a bytearray starting at address 0, the symbol
+    table of labels and constants, the listing, which is the contents of a .p
+    file line by line, and a list of (line number, message) diagnostics. The
+    image and listing are only complete if there are no diagnostics."""
+
+    def __init__(self, image, symbols, listing, diagnostics, statistics=None):
+        self.image = image
+        self.symbols = symbols
+        self.listing = listing
+        self.diagnostics = diagnostics
+        self.statistics = statistics
+
+    @property
+    def success(self):
+        return not self.diagnostics
+
+    def write(self, p_file_name):
+        """Write the listing as a .p file, which simulators can load"""
+        with open(p_file_name, 'w') as p_file:
+            p_file.writelines(self.listing)
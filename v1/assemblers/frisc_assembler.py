@@ -1,8 +1,12 @@
 import os
 import re
+import time
 # import sys
 
-from assemblers.assembler import Assembler
+from array import array
+
+from assemblers.assembler import Assembler, AssemblyResult
+from assemblers.statistics import AssemblerStatistics
 from utils.frisc_parsing import *
 
 
@@ -10,103 +14,315 @@ class FRISCAssembler(Assembler):
     """FRISC processor assembler, extending abstract class Assembler"""
 
     @classmethod
-    def assemble(cls, file_name):
+    def assemble(cls, file_name, statistics=None):
         """Assembles a file into FRISC processor machine code
 
         Takes a file path, creates .p and .e files containing machine code, and
-        returns a (message, success) pair
+        returns a (message, success) pair. If an AssemblerStatistics object is
+        given, the time and item counts of every phase are added to it.
+        """
+        with open(file_name, 'r') as file:
+            result = cls.assemble_source(file, statistics=statistics)
+
+        if result.diagnostics:
+            for file_line_number, message in result.diagnostics:
+                print(message + ' in line ' + str(file_line_number))
+            return None, False
+
+        start = time.perf_counter()
+        result.write(os.path.abspath(file_name).rsplit('.', maxsplit=1)[0] + '.p')
+        result.statistics.times['write'] += time.perf_counter() - start
+        return None, True
+
+    @classmethod
+    def assemble_source(cls, source, is_cancelled=None, statistics=None):
+        """Assembles source code in memory, without writing any files
+
+        Takes the source code as a string or an iterable of lines, such as an
+        open file, and returns an AssemblyResult, or None if is_cancelled, which
+        is polled once per line, returns True before assembling finishes
+        """
+        if statistics is None:
+            statistics = AssemblerStatistics()
+        if isinstance(source, str):
+            source = source.splitlines(True)
+
+        diagnostics = []
+        preprocessed = cls._preprocess(source, diagnostics, is_cancelled, statistics)
+        if preprocessed is None:
+            return None
+
+        preprocessed_lines, constants = preprocessed
+        image = bytearray()
+        listing = []
+
+        start = time.perf_counter()
+        encode_time = 0.0
+        for file_line_number, line in enumerate(preprocessed_lines, 1):
+            if is_cancelled is not None and is_cancelled():
+                return None
+
+            line_number, machine_code = '', ['']
+            if not line['empty']:
+                try:
+                    encode_start = time.perf_counter()
+                    encoded = line['instruction'].encode(constants, line['line_number'])
+                    encode_time += time.perf_counter() - encode_start
+                except KeyError as e:
+                    diagnostics.append((file_line_number, 'Undefined label ' + str(e.args[0])))
+                    continue
+                except Exception as e:
+                    diagnostics.append((file_line_number, str(e) or e.__class__.__name__))
+                    continue
+
+                statistics.counts['encoded_words'] += len(encoded)
+                address = line['line_number']
+                if len(image) < address + 4 * len(encoded):
+                    image.extend(bytes(address + 4 * len(encoded) - len(image)))
+                for i, word in enumerate(encoded):
+                    image[address + 4 * i: address + 4 * i + 4] = int(word, 2).to_bytes(4, 'little')
+
+                line_number = Binary32(address).to_hex_string()
+                machine_code = [cls._rearrange(Binary32.from_digits(list(enc)).to_pretty_hex_string()) for enc in encoded]
+
+            listing.append(line_number.ljust(10) + machine_code[0].ljust(13) + line['original'] + '\n')
+            for mc in tail(machine_code):
+                listing.append(mc.rjust(21) + '\n')
+
+        statistics.times['encode'] += encode_time
+        statistics.times['write'] += time.perf_counter() - start - encode_time
+        return AssemblyResult(image, constants, listing, sorted(diagnostics), statistics)
+
+    @classmethod
+    def assemble_streaming(cls, file_name, statistics=None):
+        """Assembles a file like assemble, for sources too large to hold in memory
+
+        The first pass parses the file, lays out addresses and encodes every
+        instruction whose labels are already defined, to find errors, keeping
+        only the address and number of machine code words of each line, and
+        the names of labels referred to before they are defined, with the first
+        line referring to each. The second pass reads the file again, parses and encodes the lines with
+        machine code once more, and writes the .p file as it goes, so its time
+        is counted as writing.
         """
+        if statistics is None:
+            statistics = AssemblerStatistics()
+        clock = time.perf_counter
+
+        diagnostics = []
         constants = {}
+        addresses, sizes = array('q'), array('B')
+        references = {}
 
         with open(file_name, 'r') as file:
+            for index, line in enumerate(cls._preprocess_lines(file, diagnostics, constants, statistics)):
+                if line['empty']:
+                    addresses.append(-1)
+                    sizes.append(0)
+                    continue
+
+                instruction = line['instruction']
+                addresses.append(line['line_number'])
+                labels = [item.contents for item in instruction.contents
+                          if isinstance(item, Label) and item.contents not in constants]
+                if labels:
+                    # Only instructions refer to labels, and they are a word each
+                    for label in labels:
+                        references.setdefault(label, index)
+                    sizes.append(1)
+                    statistics.counts['encoded_words'] += 1
+                    continue
 
-            current_line_number = 0
-            next_line_number = 0
-            file_line_number = 1
-            preprocessed_lines = []
+                start = clock()
+                try:
+                    size = len(instruction.encode(constants, line['line_number']))
+                except Exception as e:
+                    diagnostics.append((index + 1, str(e) or e.__class__.__name__))
+                    size = 0
+                statistics.times['encode'] += clock() - start
 
-            for line in file:
-                preprocessed_line = {'original': line[:-1]}
-                no_comments = line.upper().split(cls.config['LINE_COMMENT_START'], maxsplit=1)[0]
+                sizes.append(size)
+                statistics.counts['encoded_words'] += size
 
-                if len(no_comments) > 0:
-                    label, instruction_part = re.split('\s', no_comments, maxsplit=1) if not no_comments[0].isspace() else ['', no_comments]
+        for label, index in references.items():
+            if label not in constants:
+                diagnostics.append((index + 1, 'Undefined label ' + label))
 
-                    tokens = split_on_tokens(instruction_part)
+        if diagnostics:
+            for file_line_number, message in sorted(diagnostics):
+                print(message + ' in line ' + str(file_line_number))
+            return None, False
 
-                    blank = len(tokens) == 0
-                    pseudo = True
-                    is_equ = False
+        p_file_name = os.path.abspath(file_name).rsplit('.', maxsplit=1)[0] + '.p'
+        scratch = AssemblerStatistics()
+        start = clock()
+        with open(file_name, 'r') as file, open(p_file_name, 'w') as p_file:
+            for index, line in enumerate(file):
+                address = addresses[index]
+                if address < 0:
+                    p_file.write(''.ljust(23) + line[:-1] + '\n')
+                    continue
 
-                    if not blank:
-                        try:
-                            instruction = parse_instruction(tokens)
-                        except SyntaxError:
-                            print('Syntax error in line ' + str(file_line_number))
-                            return None, False
+                try:
+                    encoded = cls._parse(cls._split_line(line)[1], scratch).encode(constants, address)
+                except Exception as e:
+                    diagnostics.append((index + 1, str(e) or e.__class__.__name__))
+                    continue
+                if len(encoded) != sizes[index]:
+                    diagnostics.append((index + 1, 'Machine code size changed between passes'))
+                    continue
 
-                        parts = instruction.contents
+                machine_code = [' '.join('{:02X}'.format(byte) for byte in int(word, 2).to_bytes(4, 'little'))
+                                for word in encoded]
+                p_file.write(Binary32(address).to_hex_string().ljust(10) + machine_code[0].ljust(13) + line[:-1] + '\n')
+                for mc in tail(machine_code):
+                    p_file.write(mc.rjust(21) + '\n')
 
-                        preprocessed_line['instruction'] = instruction
+        statistics.times['write'] += clock() - start
+        if diagnostics:
+            os.remove(p_file_name)
+            for file_line_number, message in diagnostics:
+                print(message + ' in line ' + str(file_line_number))
+            return None, False
+        return None, True
 
-                        if isinstance(instruction, OrgPseudoInstr):
-                            next_line_number = get_int_from_tokens(parts[1:])
+    @classmethod
+    def check(cls, source, is_cancelled=None):
+        """Assembles source code in memory, returning only its list of (line
+        number, message) diagnostics, or None if cancelled, see assemble_source
+        """
+        result = cls.assemble_source(source, is_cancelled)
+        return None if result is None else result.diagnostics
+
+    @classmethod
+    def _preprocess(cls, lines, diagnostics, is_cancelled=None, statistics=None):
+        """Parses lines and assigns them addresses, collecting label values
+
+        Syntax errors are appended to diagnostics, returns a (preprocessed
+        lines, constants) pair, or None if cancelled
+        """
+        constants = {}
+        preprocessed_lines = []
+        for preprocessed_line in cls._preprocess_lines(lines, diagnostics, constants, statistics):
+            if is_cancelled is not None and is_cancelled():
+                return None
+            preprocessed_lines.append(preprocessed_line)
+
+        return preprocessed_lines, constants
+
+    @classmethod
+    def _preprocess_lines(cls, lines, diagnostics, constants, statistics=None):
+        """Parses lines one by one, yielding each with its address
+
+        Labels are added to constants as they are defined, so a line may refer
+        to labels which are not yet in constants when it is yielded.
+        """
+        if statistics is None:
+            statistics = AssemblerStatistics()
+        times, counts = statistics.times, statistics.counts
+        clock = time.perf_counter
 
-                        elif isinstance(instruction, EquPseudoInstr):
-                            is_equ = True
-                            constants[label] = get_int_from_tokens(parts[1:])
+        current_line_number = 0
+        next_line_number = 0
+        file_line_number = 1
+        labels = len(constants)
 
-                        elif isinstance(instruction, SpacePseudoInstr):
-                            next_line_number = current_line_number + FRISCAssembler._round_to_word(get_int_from_tokens(parts[1:]))
+        for line in lines:
+            start = clock()
+            preprocessed_line = {'original': line[:-1]}
+            split = cls._split_line(line)
 
-                        elif isinstance(instruction, DataPseudoInstr):
-                            next_line_number = current_line_number + get_data_size(instruction) * get_data_length(instruction)
-                            pseudo = False
+            if split is not None:
+                label, tokens = split
+                counts['tokens'] += len(tokens)
 
-                        else:
-                            pseudo = False
-                            next_line_number = current_line_number + 4
+                blank = len(tokens) == 0
+                pseudo = True
+                is_equ = False
 
-                    preprocessed_line['empty'] = blank or pseudo
-                    preprocessed_line['line_number'] = current_line_number
-                    preprocessed_line['label'] = label
+                parse_start = clock()
+                times['tokenize'] += parse_start - start
+                if not blank:
+                    try:
+                        instruction = cls._parse(tokens, statistics)
+                        counts['instructions'] += 1
+                    except SyntaxError:
+                        diagnostics.append((file_line_number, 'Syntax error'))
+                        counts['syntax_errors'] += 1
+                        instruction = None
+                        blank = True
+                start = clock()
+                times['parse'] += start - parse_start
 
-                    if label and not is_equ:
-                        constants[label] = current_line_number
+                if not blank:
+                    parts = instruction.contents
 
-                    current_line_number = next_line_number
+                    preprocessed_line['instruction'] = instruction
 
-                else:
-                    preprocessed_line['empty'] = True
-                    preprocessed_line['line_number'] = -1
+                    if isinstance(instruction, OrgPseudoInstr):
+                        next_line_number = get_int_from_tokens(parts[1:])
 
-                preprocessed_lines.append(preprocessed_line)
-                file_line_number += 1
+                    elif isinstance(instruction, EquPseudoInstr):
+                        is_equ = True
+                        constants[label] = get_int_from_tokens(parts[1:])
 
-            file_path = os.path.abspath(file_name)
-            base_name = file_path.rsplit('.', maxsplit=1)[0]
+                    elif isinstance(instruction, SpacePseudoInstr):
+                        next_line_number = current_line_number + FRISCAssembler._round_to_word(get_int_from_tokens(parts[1:]))
 
-            with open(base_name + '.p', 'w') as pfile:
-                for line in preprocessed_lines:
+                    elif isinstance(instruction, DataPseudoInstr):
+                        next_line_number = current_line_number + get_data_size(instruction) * get_data_length(instruction)
+                        pseudo = False
 
-                    if not line['empty']:
-                        line_number = Binary32(line['line_number']).to_hex_string()
-                        try:
-                            encoded = line['instruction'].encode(constants, line['line_number'])
-                            machine_code = [cls._rearrange(Binary32.from_digits(list(enc)).to_pretty_hex_string()) for enc in encoded]
-                        except Exception as e:
-                            print(line)
-                            print(constants)
-                            raise e
                     else:
-                        line_number = ''
-                        encoded = ['']
-                        machine_code = ['']
+                        pseudo = False
+                        next_line_number = current_line_number + 4
+
+                preprocessed_line['empty'] = blank or pseudo
+                preprocessed_line['line_number'] = current_line_number
+                preprocessed_line['label'] = label
+
+                if label and not is_equ:
+                    constants[label] = current_line_number
+
+                current_line_number = next_line_number
+
+            else:
+                preprocessed_line['empty'] = True
+                preprocessed_line['line_number'] = -1
+
+            times['layout'] += clock() - start
+            yield preprocessed_line
+            file_line_number += 1
 
-                    pfile.write(line_number.ljust(10) + machine_code[0].ljust(13) + line['original'] + '\n')
+        counts['lines'] += file_line_number - 1
+        counts['labels'] += len(constants) - labels
+
+    @classmethod
+    def _split_line(cls, line):
+        """Split a line into its label and the tokens of its instruction, or return None for lines with only a comment"""
+        no_comments = line.upper().split(cls.config['LINE_COMMENT_START'], maxsplit=1)[0]
+        if len(no_comments) == 0:
+            return None
+
+        label, instruction_part = re.split('\s', no_comments, maxsplit=1) if not no_comments[0].isspace() else ['', no_comments]
+        return label, split_on_tokens(instruction_part)
+
+    @classmethod
+    def _parse(cls, tokens, statistics):
+        """Parses tokens like parse_instruction, counting attempts and failures of every grammar alternative"""
+        for alternative in FRISCInstr.items:
+            name = alternative.__class__.__name__
+            statistics.parse_attempts[name] += 1
+            try:
+                parsed = alternative(tokens)
+            except Exception:
+                statistics.parse_failures[name] += 1
+                continue
 
-                    for mc in tail(machine_code):
-                        pfile.write(mc.rjust(21) + '\n')
+            if parsed[1]:
+                raise SyntaxError('Extra tokens at the end of instruction')
+            return parsed[0].purge()
+        raise SyntaxError('Cannot match {}'.format(tokens))
 
     def _rearrange(string):
         return ' '.join(reversed(string.split(' ')))
@@ -0,0 +1,121 @@
+from utils.frisc_parsing import ALInstr, Condition, GeneralRegister, JumpInstr, MemInstr, RetInstr, StackInstr
+
+
+class FRISCDisassembler:
+    """FRISC processor disassembler, the inverse of FRISCAssembler
+
+    Decode tables are built from the opcode, condition and register tables of
+    frisc_parsing, indexed by the integer fields of a word. Words decode the
+    way FRISCSimulator executes them, and words which are not instructions
+    decode to a DW pseudo instruction. Decoded text is memoized per word, so
+    disassembling memory which is mostly the same program stays cheap."""
+
+    CACHE_SIZE = 65536
+
+    _cache = {}
+
+    @classmethod
+    def disassemble(cls, word):
+        """Return the assembly text of a 32 bit instruction word"""
+        text = cls._cache.get(word)
+        if text is None:
+            if len(cls._cache) >= cls.CACHE_SIZE:
+                cls._cache.clear()
+            text = cls._cache[word] = _decode(word)
+        return text
+
+    @classmethod
+    def disassemble_range(cls, memory, start, end):
+        """Disassemble the words of memory between two addresses, end exclusive
+
+        Memory is a sequence of bytes, or of anything convertible with int,
+        such as a simulator's memory. Returns a list of (address, word, text)."""
+        lines = []
+        for address in range(start & ~3, min(end, len(memory) - 3), 4):
+            word = ((int(memory[address]) & 0xFF) | (int(memory[address + 1]) & 0xFF) << 8 |
+                    (int(memory[address + 2]) & 0xFF) << 16 | (int(memory[address + 3]) & 0xFF) << 24)
+            lines.append((address, word, cls.disassemble(word)))
+        return lines
+
+
+# Decode tables
+
+def _codes(table):
+    """Invert an encoding table, keeping the first name of codes with several"""
+    codes = {}
+    for name, code in table.items():
+        codes.setdefault(int(code, 2), name)
+    return codes
+
+
+_REGISTERS = {int(GeneralRegister('R{}'.format(i)).encode(), 2): 'R{}'.format(i) for i in range(8)}
+
+_CONDITIONS = {0: '', **_codes(Condition._codes)}
+
+_ALU = _codes(ALInstr._opcodes)
+
+_MEMORY = _codes(MemInstr._opcodes)
+
+_STACK = _codes(StackInstr._opcodes)
+
+_JUMPS = _codes(JumpInstr._opcodes)
+
+_RETURNS = {int(RetInstr._types[name], 2): name for name in ('RET', 'RETI', 'RETN')}
+
+_HALT = int(RetInstr._opcodes['HALT'], 2)
+
+
+def _number(value):
+    """Format a number as FRISC hexadecimal, which must start with a digit"""
+    text = '{:X}'.format(abs(value))
+    return ('-' if value < 0 else '') + (text if text[0].isdigit() else '0' + text)
+
+
+def _decode(word):
+    opcode = word >> 27
+    funct = (word >> 26) & 1
+    destination = _REGISTERS[(word >> 23) & 7]
+    source1 = _REGISTERS[(word >> 20) & 7]
+    source2 = _REGISTERS[(word >> 17) & 7]
+    immediate = (word & 0xFFFFF) - (1 << 20) if word & 0x80000 else word & 0xFFFFF
+    operand2 = _number(immediate) if funct else source2
+
+    if opcode == 0:
+        if source1 != 'R0':
+            if (word >> 21) & 1:
+                destination = 'SR'
+            if (word >> 20) & 1:
+                operand2 = 'SR'
+        return 'MOVE {}, {}'.format(operand2, destination)
+
+    if opcode in _ALU:
+        name = _ALU[opcode]
+        if name == 'CMP':
+            return 'CMP {}, {}'.format(source1, operand2)
+        return '{} {}, {}, {}'.format(name, source1, operand2, destination)
+
+    if opcode in _STACK:
+        return '{} {}'.format(_STACK[opcode], destination)
+
+    if opcode in _MEMORY:
+        if not funct:
+            address = _number(immediate)
+        elif immediate:
+            address = '{}{}{}'.format(source1, '-' if immediate < 0 else '+', _number(abs(immediate)))
+        else:
+            address = source1
+        return '{} {}, ({})'.format(_MEMORY[opcode], destination, address)
+
+    condition = (word >> 22) & 0xF
+    if opcode >> 3 == 0b11 and condition in _CONDITIONS:
+        suffix = '_' + _CONDITIONS[condition] if condition else ''
+        if opcode == 0b11010:
+            return 'JR{} {}'.format(suffix, _number(immediate))
+        if opcode in _JUMPS:
+            return '{}{} {}'.format(_JUMPS[opcode], suffix, _number(immediate) if funct else '(' + source2 + ')')
+        if opcode == 0b11011:
+            return _RETURNS.get(word & 3, 'RET') + suffix
+        if opcode == _HALT:
+            return 'HALT' + suffix
+
+    return 'DW {}'.format(_number(word))
@@ -0,0 +1,36 @@
+from collections import Counter
+
+
+class AssemblerStatistics:
+    """Wall time and item counts of the phases of an assembly
+
+    Phases are tokenizing lines, parsing them, laying out addresses and
+    labels, encoding instructions and writing the output. Parse attempts and
+    failures are counted per grammar alternative, that is per instruction
+    class tried on a line, since a line is matched against the alternatives
+    in order until one of them succeeds."""
+
+    PHASES = ('tokenize', 'parse', 'layout', 'encode', 'write')
+
+    COUNTS = ('lines', 'tokens', 'instructions', 'labels', 'encoded_words', 'syntax_errors')
+
+    def __init__(self):
+        self.times = dict.fromkeys(self.PHASES, 0.0)
+        self.counts = dict.fromkeys(self.COUNTS, 0)
+        self.parse_attempts = Counter()
+        self.parse_failures = Counter()
+
+    def to_dict(self):
+        return {
+            'times': dict(self.times),
+            'counts': dict(self.counts),
+            'parse': {name: {'attempts': attempts, 'failures': self.parse_failures[name]}
+                      for name, attempts in self.parse_attempts.most_common()}
+        }
+
+    def __str__(self):
+        lines = ['{:<16}{:10.2f} ms'.format(phase, 1000 * seconds) for phase, seconds in self.times.items()]
+        lines += ['{:<16}{:10}'.format(name, count) for name, count in self.counts.items()]
+        lines += ['{:<16}{:10} attempts {:10} failures'.format(name, attempts, self.parse_failures[name])
+                  for name, attempts in self.parse_attempts.most_common()]
+        return '\n'.join(lines)
@@ -0,0 +1,259 @@
+"""Headless batch execution of FRISC programs and test cases
+
+Reads a manifest with one JSON entry per line:
+
+    {"id": "case-1", "program": "test.a", "max_steps": 10000,
+     "registers": {"R0": 5}, "memory": {"0x100": [1, 2, 3, 4]},
+     "expected": {"registers": {"R1": 6}, "memory": {"0x100": [1, 2, 3, 4]}},
+     "timing": {"default_wait_states": 0, "regions": [["0x8000", "0xFFFF", 4]]}}
+
+and writes one JSON result per line, in manifest order, as soon as it is
+available. With timing given, cycles are clock cycles of the FRISC timing
+model, with the wait states of the listed inclusive memory regions, otherwise
+they count executed instructions. Entries are distributed over a pool of worker processes, every
+worker loads each program image only once and restores it from a snapshot
+for every entry running that program. Entries with "coverage": true, or all
+of them with --lcov, report how many of their instructions and conditional
+branch directions were covered, and --lcov writes the coverage of every
+program merged over its entries. With --assembler-statistics, results
+of entries with assembly sources also hold the phase times and counts of
+assembling them, under "assembler". Sources are assembled in memory, and
+entries whose program fails to assemble are not run, their results have the
+stop reason "assembly_error" and the assembler's diagnostics. Registers may
+be named by their aliases, such as SP, and unknown registers, or expected
+memory outside of memory, fail only their entry, with an "error".
+
+Usage: python batch_runner.py manifest.jsonl [--workers N] [--max-steps N] [--assembler-statistics] [--lcov coverage.info]
+"""
+import argparse
+import json
+import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+
+from assemblers.frisc_assembler import FRISCAssembler
+from assemblers.statistics import AssemblerStatistics
+from simulators.frisc_simulator import *
+
+DEFAULT_MEMORY_SIZE = 65536
+DEFAULT_MAX_STEPS = 100000
+
+_simulators = {}
+_images = {}
+_listings = {}
+
+
+def load_manifest(manifest_file):
+    for line in manifest_file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def prepare_programs(entries, assembler_statistics=False):
+    """Assemble every distinct source program once in memory, and return the listings by program
+
+    Entries whose program fails to assemble get its diagnostics, as a list of
+    {"line": ..., "message": ...}. With assembler_statistics, the phase times
+    and counts of assembling a program are added to its entries, and reported
+    with their results."""
+    results = {}
+    listings = {}
+    for entry in entries:
+        program = entry['program']
+        if program.lower().endswith('.a'):
+            result = results.get(program)
+            if result is None:
+                with open(program, 'r') as source:
+                    result = results[program] = FRISCAssembler.assemble_source(source)
+                if result.success:
+                    listings[program] = result.listing
+            if not result.success:
+                entry['diagnostics'] = [{'line': line, 'message': message} for line, message in result.diagnostics]
+            if assembler_statistics:
+                entry['assembler'] = result.statistics.to_dict()
+    return listings
+
+
+def set_listings(listings):
+    """Set the listings of assembled programs in a worker, which loads them instead of .p files"""
+    _listings.clear()
+    _listings.update(listings)
+
+
+def get_simulator(program, memory_size):
+    """Return this worker's simulator, with a freshly loaded program image"""
+    simulator = _simulators.get(memory_size)
+    if simulator is None:
+        simulator = _simulators[memory_size] = FRISCSimulator(memory_size)
+
+    image = _images.get((program, memory_size))
+    if image is None:
+        simulator.init()
+        if program in _listings:
+            simulator.load_listing(_listings[program])
+        else:
+            simulator.load(program)
+        image = _images[(program, memory_size)] = simulator.save_snapshot()
+    else:
+        simulator.restore_snapshot(image)
+    return simulator
+
+
+def set_timing(simulator, timing):
+    if timing is None:
+        simulator.disable_timing()
+        return
+
+    model = FRISCSimulator.timing_model(timing.get('default_wait_states', 0))
+    for start, end, wait_states in timing.get('regions', []):
+        model.add_region(_to_int(start), _to_int(end), wait_states)
+    simulator.enable_timing(model)
+
+
+def run_entry(entry):
+    result = {'id': entry.get('id'), 'program': entry['program']}
+    if 'assembler' in entry:
+        result['assembler'] = entry['assembler']
+    if 'diagnostics' in entry:
+        result['stop_reason'] = 'assembly_error'
+        result['diagnostics'] = entry['diagnostics']
+        if 'expected' in entry:
+            result['passed'] = False
+        return result
+
+    simulator = None
+    try:
+        simulator = get_simulator(entry['program'], entry.get('memory_size', DEFAULT_MEMORY_SIZE))
+        set_timing(simulator, entry.get('timing'))
+        if entry.get('coverage'):
+            result['coverage'] = simulator.enable_coverage()
+        else:
+            simulator.disable_coverage()
+
+        for name, value in entry.get('registers', {}).items():
+            simulator.registers[register_name(simulator, name)] = Binary32(_to_int(value) & 0xFFFFFFFF)
+        for address, data in entry.get('memory', {}).items():
+            for i, byte in enumerate(data):
+                simulator.set_byte_in_memory(_to_int(address) + i, Binary8(_to_int(byte) & 0xFF))
+
+        simulator.run(entry.get('max_steps', DEFAULT_MAX_STEPS))
+        result['stop_reason'] = 'halted' if simulator.state == SimulatorState.TERMINATED else 'max_steps'
+    except Exception as e:
+        result['stop_reason'] = 'error'
+        result['error'] = str(e)
+
+    if simulator is None:
+        return result
+
+    result['cycles'] = simulator.cycle
+    result['registers'] = {name: value.to_hex_string() for name, value in simulator.registers.items()}
+
+    if 'expected' in entry:
+        try:
+            result['mismatches'] = check_expected(simulator, entry['expected'])
+            result['passed'] = result['stop_reason'] != 'error' and not result['mismatches']
+        except Exception as e:
+            result.setdefault('error', str(e))
+            result['passed'] = False
+    return result
+
+
+def register_name(simulator, name):
+    """Resolve a register name or alias, such as SP, raising ValueError for unknown names"""
+    register = simulator.register_aliases.get(name, name)
+    if register not in simulator.registers:
+        raise ValueError('Unknown register {}'.format(name))
+    return register
+
+
+def check_expected(simulator, expected):
+    """Return a dictionary of expected values which were not matched, paired with the actual ones
+
+    Raises ValueError for unknown registers and addresses outside of memory."""
+    mismatches = {}
+    for name, value in expected.get('registers', {}).items():
+        actual = int(simulator.registers[register_name(simulator, name)]) & 0xFFFFFFFF
+        if actual != _to_int(value) & 0xFFFFFFFF:
+            mismatches[name] = {'expected': value, 'actual': '{:08X}'.format(actual)}
+    for address, data in expected.get('memory', {}).items():
+        actual = [int(simulator.get_byte_from_memory(_to_int(address) + i)) & 0xFF for i in range(len(data))]
+        if actual != [_to_int(byte) & 0xFF for byte in data]:
+            mismatches[address] = {'expected': data, 'actual': actual}
+    return mismatches
+
+
+def collect_coverage(results, coverages, listings):
+    """Replace the coverage of every result with a summary, merging it into the coverage of its program
+
+    Listings of programs loaded from .p files are read into listings."""
+    for result in results:
+        coverage = result.get('coverage')
+        if coverage is not None:
+            program = result['program']
+            if program not in listings:
+                with open(program, 'r') as p_file:
+                    listings[program] = p_file.readlines()
+            if program in coverages:
+                coverages[program].merge(coverage)
+            else:
+                coverages[program] = coverage
+            result['coverage'] = coverage.summary(listings[program])
+        yield result
+
+
+def write_lcov(coverages, listings, lcov_file_name):
+    with open(lcov_file_name, 'w') as lcov_file:
+        for program, coverage in coverages.items():
+            lcov_file.write(coverage.format_lcov(listings[program], program))
+
+
+def run_batch(entries, workers=None, chunk_size=16, listings=None):
+    """Run all the entries over a pool of worker processes, yielding results in order
+
+    Programs with a listing, from prepare_programs, are loaded from it instead of a .p file."""
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_listings, initargs=(listings or {},)) as executor:
+        for result in executor.map(run_entry, entries, chunksize=chunk_size):
+            yield result
+
+
+def _to_int(value):
+    return int(value, 0) if isinstance(value, str) else int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run FRISC programs and test cases in parallel')
+    parser.add_argument('manifest', help='manifest file, one JSON entry per line')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--max-steps', type=int, default=None, help='default instruction budget for entries')
+    parser.add_argument('--assembler-statistics', action='store_true',
+                        help='report phase times and counts of assembling each program with its results')
+    parser.add_argument('--lcov', help='record coverage of every entry, and write it per program to an LCOV file')
+    arguments = parser.parse_args()
+
+    with open(arguments.manifest, 'r') as manifest_file:
+        entries = list(load_manifest(manifest_file))
+
+    base_path = os.path.dirname(os.path.abspath(arguments.manifest))
+    for entry in entries:
+        entry['program'] = os.path.join(base_path, entry['program'])
+        if arguments.max_steps is not None:
+            entry.setdefault('max_steps', arguments.max_steps)
+        if arguments.lcov is not None:
+            entry['coverage'] = True
+
+    listings = prepare_programs(entries, arguments.assembler_statistics)
+
+    coverages = {}
+    coverage_listings = dict(listings)
+    results = run_batch(entries, arguments.workers, listings=listings)
+    for result in collect_coverage(results, coverages, coverage_listings):
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+
+    if arguments.lcov is not None:
+        write_lcov(coverages, coverage_listings, arguments.lcov)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+"""Benchmarks of binary arithmetic, the assembler and the simulator
+
+Runs four groups of benchmarks, each reporting the best of a number of
+repeats:
+
+    binary     - BinaryNumber operations, in microseconds per operation
+    assembler  - assembling generated sources of different sizes, per phase
+    load       - loading assembled programs into a simulator
+    simulator  - instructions per second on memcpy, bubble sort and recursion,
+                 with fast-forwarding of delay loops disabled
+
+Generated sources are seeded, so every run measures the same work. Results
+are printed, and saved as JSON with --output, to compare between versions.
+
+Usage: python benchmark.py [--output results.json] [--repeat N] [--sizes 1000 10000 100000] [--only GROUP ...]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from assemblers.frisc_assembler import FRISCAssembler
+from simulators.frisc_simulator import *
+from utils.binary import *
+from utils.frisc_parsing import split_on_tokens
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+KERNELS = {
+    'memcpy': ("""        MOVE SRC, R0
+        MOVE 400, R2
+FILL    STORE R2, (R0)
+        ADD R0, 4, R0
+        SUB R2, 1, R2
+        JR_NZ FILL
+        MOVE SRC, R0
+        MOVE DST, R1
+        MOVE 400, R2
+LOOP    LOAD R3, (R0)
+        STORE R3, (R1)
+        ADD R0, 4, R0
+        ADD R1, 4, R1
+        SUB R2, 1, R2
+        JR_NZ LOOP
+        HALT
+
+        ORG 1000
+SRC     DS 1000
+DST     DS 1000
+""", lambda simulator: [int(simulator.get_word_from_memory(Binary32(0x2000 + 4 * i))) for i in range(0x400)] ==
+                       list(range(0x400, 0, -1))),
+
+    'bubble_sort': ("""        MOVE ARRAY, R4
+        MOVE 40, R0
+        MOVE R4, R1
+        MOVE R0, R2
+FILL    STORE R2, (R1)
+        ADD R1, 4, R1
+        SUB R2, 1, R2
+        JR_NZ FILL
+        SUB R0, 1, R5
+OUTER   MOVE R4, R1
+        MOVE R5, R6
+INNER   LOAD R2, (R1)
+        LOAD R3, (R1+4)
+        CMP R2, R3
+        JR_SLE NEXT
+        STORE R3, (R1)
+        STORE R2, (R1+4)
+NEXT    ADD R1, 4, R1
+        SUB R6, 1, R6
+        JR_NZ INNER
+        SUB R5, 1, R5
+        JR_NZ OUTER
+        HALT
+
+ARRAY   DS 100
+""", lambda simulator: [int(simulator.get_word_from_memory(Binary32(0x5C + 4 * i))) for i in range(0x40)] ==
+                       list(range(1, 0x41))),
+
+    'recursion': ("""        MOVE 10000, SP
+        MOVE 0F, R0
+        CALL FIB
+        HALT
+FIB     CMP R0, 2
+        JR_ULT BASE
+        PUSH R0
+        SUB R0, 1, R0
+        CALL FIB
+        POP R0
+        PUSH R1
+        SUB R0, 2, R0
+        CALL FIB
+        POP R2
+        ADD R1, R2, R1
+        RET
+BASE    MOVE R0, R1
+        RET
+""", lambda simulator: int(simulator.registers['R1']) == 610)
+}
+
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+# Binary arithmetic
+
+def benchmark_binary(repeat):
+    x, y, amount = Binary32(0x89ABCDEF), Binary32(0x12345678), Binary32(5)
+    operations = {
+        'add': lambda: x + y,
+        'sub': lambda: x - y,
+        'adc': lambda: x.adc(y, '1'),
+        'get_flags': (x + y).get_flags,
+        'lshift': lambda: x << amount,
+        'rshift': lambda: x >> amount,
+        'arshift': lambda: x.arshift(amount),
+        'rotl': lambda: x.rotl(amount),
+        'rotr': lambda: x.rotr(amount),
+        'to_hex_string': x.to_hex_string,
+        'from_hex': lambda: BinaryNumber.from_hex('89ABCDEF', 32),
+        'byte_from_hex': lambda: Binary8.from_hex('AB'),
+        'int': lambda: int(x)
+    }
+
+    results = {}
+    for name, operation in operations.items():
+        number = 2000
+        results[name] = 1e6 * min(timeit.repeat(operation, number=number, repeat=repeat)) / number
+    return results
+
+
+# Assembler
+
+def generate_source(lines, seed=0):
+    """Generate an assembly source of a given number of lines, mixing all kinds of instructions"""
+    generator = random.Random(seed)
+    registers = ['R{}'.format(i) for i in range(7)]
+    templates = [
+        lambda: ' ADD {}, {}, {}'.format(*generator.sample(registers, 3)),
+        lambda: ' SUB {}, 0{:X}, {}'.format(generator.choice(registers), generator.randrange(0x100), generator.choice(registers)),
+        lambda: ' AND {}, {}, {}'.format(*generator.sample(registers, 3)),
+        lambda: ' SHL {}, 0{:X}, {}'.format(generator.choice(registers), generator.randrange(32), generator.choice(registers)),
+        lambda: ' CMP {}, {}'.format(*generator.sample(registers, 2)),
+        lambda: ' MOVE 0{:X}, {}'.format(generator.randrange(0x1000), generator.choice(registers)),
+        lambda: ' LOAD {}, ({}+0{:X})'.format(generator.choice(registers), generator.choice(registers), 4 * generator.randrange(16)),
+        lambda: ' STORE {}, (DATA)'.format(generator.choice(registers)),
+        lambda: ' PUSH {}'.format(generator.choice(registers)),
+        lambda: ' POP {}'.format(generator.choice(registers)),
+        lambda: ' JR_NZ L{}'.format(generator.randrange(labels)),
+        lambda: ' JP_EQ L{}'.format(generator.randrange(labels)),
+        lambda: ' CALL L{}'.format(generator.randrange(labels)),
+        lambda: ' RET',
+        lambda: ' ; comment line',
+    ]
+
+    labels = max(lines // 20, 1)
+    source = []
+    for i in range(lines - 2):
+        line = generator.choice(templates)()
+        if i % 20 == 0:
+            line = 'L{}'.format(i // 20) + line if not line.startswith(' ;') else 'L{} ADD R0, R0, R0'.format(i // 20)
+        source.append(line)
+    source += [' HALT', 'DATA DW 0']
+    return '\n'.join(source) + '\n'
+
+
+def benchmark_assembler(sizes, repeat, directory):
+    results = {}
+    for size in sizes:
+        source = generate_source(size)
+        lines = source.splitlines(True)
+        file_name = os.path.join(directory, 'generated_{}.a'.format(size))
+        with open(file_name, 'w') as file:
+            file.write(source)
+
+        def encode():
+            preprocessed_lines, constants = FRISCAssembler._preprocess(lines, [])
+            for line in preprocessed_lines:
+                if not line['empty']:
+                    line['instruction'].encode(constants, line['line_number'])
+
+        phases = {
+            'tokenize': best_time(lambda: [split_on_tokens(line.upper().split(';', maxsplit=1)[0]) for line in lines], repeat),
+            'preprocess': best_time(lambda: FRISCAssembler._preprocess(lines, []), repeat),
+            'preprocess_and_encode': best_time(encode, repeat),
+            'assemble_file': best_time(lambda: FRISCAssembler.assemble(file_name), repeat),
+            'assemble_streaming': best_time(lambda: FRISCAssembler.assemble_streaming(file_name), repeat)
+        }
+        phases['lines_per_second'] = size / phases['assemble_file']
+        results[str(size)] = phases
+    return results
+
+
+# Simulator
+
+def write_program(size, directory):
+    """Assemble a generated source of a given number of lines in memory, and return the name of its .p file"""
+    p_file_name = os.path.join(directory, 'generated_{}.p'.format(size))
+    if not os.path.exists(p_file_name):
+        FRISCAssembler.assemble_source(generate_source(size)).write(p_file_name)
+    return p_file_name
+
+
+def benchmark_load(sizes, repeat, directory):
+    results = {}
+    for size in sizes:
+        p_file_name = write_program(size, directory)
+        simulator = FRISCSimulator(max(65536, 8 * size))
+
+        def load():
+            simulator.init()
+            simulator.load(p_file_name)
+
+        results[str(size)] = best_time(load, repeat)
+    return results
+
+
+def count_instructions(simulator):
+    """Run a loaded program to the end one step at a time, and return the number of instructions executed"""
+    instructions = 0
+    while simulator.state != SimulatorState.TERMINATED:
+        simulator.run_step()
+        instructions += 1
+    return instructions
+
+
+def benchmark_simulator(repeat, directory):
+    results = {}
+    for name, (source, check) in KERNELS.items():
+        file_name = os.path.join(directory, name + '.a')
+        with open(file_name, 'w') as file:
+            file.write(source)
+        FRISCAssembler.assemble(file_name)
+
+        simulator = FRISCSimulator(65536)
+        simulator.fast_forward = False
+        simulator.init()
+        simulator.load(file_name[:-2] + '.p')
+        instructions = count_instructions(simulator)
+
+        best = None
+        for _ in range(repeat):
+            simulator.init()
+            simulator.load(file_name[:-2] + '.p')
+            start = time.perf_counter()
+            simulator.run()
+            elapsed = time.perf_counter() - start
+            if not check(simulator):
+                raise RuntimeError('Kernel {} computed a wrong result'.format(name))
+            best = elapsed if best is None else min(best, elapsed)
+
+        results[name] = {'instructions': instructions, 'seconds': best, 'mips': instructions / best / 1e6}
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BASE_PATH, stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark PEAS binary arithmetic, assembler and simulator')
+    parser.add_argument('--output', help='file to save the results to, as JSON')
+    parser.add_argument('--repeat', type=int, default=3, help='number of repeats to take the best time of')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='generated source sizes, in lines')
+    parser.add_argument('--only', nargs='+', choices=['binary', 'assembler', 'load', 'simulator'],
+                        help='run only some groups of benchmarks')
+    arguments = parser.parse_args()
+    groups = arguments.only or ['binary', 'assembler', 'load', 'simulator']
+
+    results = {
+        'revision': _git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        if 'binary' in groups:
+            results['binary'] = benchmark_binary(arguments.repeat)
+        if 'assembler' in groups:
+            results['assembler'] = benchmark_assembler(arguments.sizes, arguments.repeat, directory)
+        if 'load' in groups:
+            results['load'] = benchmark_load(arguments.sizes, arguments.repeat, directory)
+        if 'simulator' in groups:
+            results['simulator'] = benchmark_simulator(arguments.repeat, directory)
+
+    print(json.dumps(results, indent=4))
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as output:
+            json.dump(results, output, indent=4)
+
+
+if __name__ == '__main__':
+    main()
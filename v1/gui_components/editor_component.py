@@ -1,4 +1,6 @@
-from gi.repository import Gtk, GtkSource
+import threading
+
+from gi.repository import GLib, Gtk, GtkSource
 
 from utils.file import *
 from utils.gui_helpers import *
@@ -6,6 +8,8 @@ from utils.gui_helpers import *
 
 class EditorComponent(Gtk.Grid):
 
+    ASSEMBLE_DELAY = 500
+
     # Initialization
 
     def __init__(self):
@@ -16,10 +20,15 @@ class EditorComponent(Gtk.Grid):
         self.buffer = GtkSource.Buffer()
         self.view = GtkSource.View.new_with_buffer(self.buffer)
 
+        self.assemble_timeout = None
+        self.assemble_generation = 0
+        self.diagnostics = {}
+
         self.set_name('editor-component')
         self.init_header_bar()
         self.init_source_view()
         self.connect('key-press-event', self.keypress)
+        self.buffer.connect('changed', self.on_buffer_changed)
 
     def init_header_bar(self):
         self.header_bar = Gtk.HeaderBar()
@@ -43,7 +52,7 @@ class EditorComponent(Gtk.Grid):
         for name, value, tooltip, is_icon, action, box in [('open', 'Open', 'Open file', False, None, 'left'),
                                                            ('new', '\uE145', 'New file', True, None, 'left'),
                                                            ('save', '\uE161', 'Save file', True, None, 'left'),
-                                                           ('assemble', '\uE869', 'Assemble file', True, None, 'left'),
+                                                           ('assemble', '\uE869', 'Assemble file', True, self.assemble, 'left'),
                                                            ('save_as', '\uE161', 'Save file as', True, None, 'right'),
                                                            ('revert', '\uE863', 'Revert', True, None, 'right'),
                                                            ('undo', '\uE166', 'Undo', True, None, 'right'),
@@ -78,6 +87,11 @@ class EditorComponent(Gtk.Grid):
 
         self.buffer.set_highlight_syntax(True)
 
+        error_attributes = GtkSource.MarkAttributes()
+        error_attributes.set_icon_name('dialog-error')
+        error_attributes.connect('query-tooltip-text', self.on_error_tooltip)
+        self.view.set_mark_attributes('error', error_attributes, 0)
+
         gutter = self.view.get_gutter(Gtk.TextWindowType.LEFT)
         gutter.set_padding(0, 0)
         line_renderer = gutter.get_renderer_at_pos(10, 0)
@@ -104,7 +118,53 @@ class EditorComponent(Gtk.Grid):
     def save_file(self):
         pass
 
+    def assemble(self, button=None):
+        """Assemble the buffer contents on a worker thread, cancelling any assembly still running
+
+        Every run gets a generation number, and is cancelled as soon as a newer
+        one starts, so its diagnostics are never shown over newer ones."""
+        if self.assemble_timeout is not None:
+            GLib.source_remove(self.assemble_timeout)
+            self.assemble_timeout = None
+
+        self.assemble_generation += 1
+        generation = self.assemble_generation
+        source = self.buffer.get_text(self.buffer.get_start_iter(), self.buffer.get_end_iter(), False)
+
+        def run():
+            from assemblers.frisc_assembler import FRISCAssembler
+
+            diagnostics = FRISCAssembler.check(source, lambda: generation != self.assemble_generation)
+            if diagnostics is not None:
+                GLib.idle_add(self.show_diagnostics, generation, diagnostics)
+
+        threading.Thread(target=run, name='assembler', daemon=True).start()
+
+    def show_diagnostics(self, generation, diagnostics):
+        if generation == self.assemble_generation:
+            self.buffer.remove_source_marks(self.buffer.get_start_iter(), self.buffer.get_end_iter(), 'error')
+            self.diagnostics = {}
+            for line_number, message in diagnostics:
+                self.diagnostics.setdefault(line_number, []).append(message)
+                self.buffer.create_source_mark(None, 'error', self.buffer.get_iter_at_line(line_number - 1))
+        return False
+
     # Events
 
+    def on_buffer_changed(self, buffer):
+        self.assemble_generation += 1
+        if self.assemble_timeout is not None:
+            GLib.source_remove(self.assemble_timeout)
+        self.assemble_timeout = GLib.timeout_add(self.ASSEMBLE_DELAY, self.on_assemble_timeout)
+
+    def on_assemble_timeout(self):
+        self.assemble_timeout = None
+        self.assemble()
+        return False
+
+    def on_error_tooltip(self, attributes, mark):
+        line_number = self.buffer.get_iter_at_mark(mark).get_line() + 1
+        return '\n'.join(self.diagnostics.get(line_number, []))
+
     def keypress(self, e, f):
         print(f.is_modifier, f.group, f.keyval, f.state)
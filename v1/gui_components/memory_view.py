@@ -0,0 +1,121 @@
+from gi.repository import Gdk, Gtk
+
+from assemblers.frisc_disassembler import FRISCDisassembler
+
+
+class MemoryModel:
+    """Formats rows of simulator memory on demand
+
+    Nothing is formatted ahead of time, so the cost of a view depends only on
+    the number of rows it shows, not on the size of the memory."""
+
+    BYTES_PER_ROW = 16
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+
+    def row_count(self):
+        return (len(self.simulator.memory) + self.BYTES_PER_ROW - 1) // self.BYTES_PER_ROW
+
+    def row_page(self, row):
+        return (row * self.BYTES_PER_ROW) >> self.simulator.config['PAGE_OFFSET_BITS']
+
+    def format_row(self, row):
+        """Return the address, the hex bytes, the printable characters and the disassembled words of a row"""
+        start = row * self.BYTES_PER_ROW
+        values = [int(byte) & 0xFF for byte in self.simulator.memory[start: start + self.BYTES_PER_ROW]]
+        return ('{:08X}'.format(start),
+                ' '.join('{:02X}'.format(value) for value in values),
+                ''.join(chr(value) if 32 <= value < 127 else '.' for value in values),
+                '; '.join(text for _, _, text in FRISCDisassembler.disassemble_range(values, 0, len(values))))
+
+
+class MemoryView(Gtk.Grid):
+    """A virtualized memory view, which only ever holds the rows that are visible
+
+    Scrolling reformats the visible rows, while update redraws only those
+    visible rows which lie in memory pages the simulator reports as changed."""
+
+    VISIBLE_ROWS = 32
+
+    # Initialization
+
+    def __init__(self):
+        Gtk.Grid.__init__(self)
+
+        self.model = None
+        self.first_row = 0
+        self.rows = [('', '', '', '')] * self.VISIBLE_ROWS
+
+        self.set_name('memory-view')
+        self.init_tree_view()
+        self.init_scrollbar()
+
+    def init_tree_view(self):
+        self.store = Gtk.ListStore(str, str, str, str)
+        for row in self.rows:
+            self.store.append(list(row))
+
+        self.view = Gtk.TreeView(model=self.store)
+        for i, title in enumerate(['Address', 'Data', 'ASCII', 'Code']):
+            self.view.append_column(Gtk.TreeViewColumn(title, Gtk.CellRendererText(), text=i))
+
+        self.view.set_hexpand(True)
+        self.view.set_vexpand(True)
+        self.view.connect('scroll-event', self.on_scroll_event)
+
+        self.attach(self.view, 0, 0, 1, 1)
+
+    def init_scrollbar(self):
+        self.adjustment = Gtk.Adjustment(0, 0, 0, 1, self.VISIBLE_ROWS, self.VISIBLE_ROWS)
+        self.adjustment.connect('value-changed', self.on_scroll)
+
+        self.scrollbar = Gtk.Scrollbar(orientation=Gtk.Orientation.VERTICAL, adjustment=self.adjustment)
+        self.attach(self.scrollbar, 1, 0, 1, 1)
+
+    def set_model(self, model):
+        self.model = model
+        self.first_row = 0
+        self.adjustment.set_upper(model.row_count())
+        self.adjustment.set_value(0)
+        self.refresh()
+
+    # Drawing
+
+    def refresh(self):
+        """Reformat all the visible rows"""
+        for i in range(self.VISIBLE_ROWS):
+            self._set_row(i, self._format(self.first_row + i))
+
+    def update(self, changed_pages):
+        """Redraw the visible rows lying in changed memory pages"""
+        if self.model is None or not changed_pages:
+            return
+
+        for i in range(self.VISIBLE_ROWS):
+            row = self.first_row + i
+            if self.model.row_page(row) in changed_pages:
+                self._set_row(i, self._format(row))
+
+    def _format(self, row):
+        return self.model.format_row(row) if self.model is not None and row < self.model.row_count() else ('', '', '', '')
+
+    def _set_row(self, i, values):
+        if self.rows[i] != values:
+            self.rows[i] = values
+            self.store[i] = list(values)
+
+    # Events
+
+    def on_scroll(self, adjustment):
+        first_row = int(adjustment.get_value())
+        if first_row != self.first_row:
+            self.first_row = first_row
+            self.refresh()
+
+    def on_scroll_event(self, widget, event):
+        success, dx, dy = event.get_scroll_deltas()
+        if not success:
+            dy = -1 if event.direction == Gdk.ScrollDirection.UP else 1
+        self.adjustment.set_value(self.adjustment.get_value() + 3 * dy)
+        return True
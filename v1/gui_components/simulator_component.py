@@ -0,0 +1,107 @@
+from gi.repository import GLib, Gtk
+
+from gui_components.memory_view import *
+from simulators.execution_controller import ExecutionController
+from utils.gui_helpers import *
+
+
+class SimulatorComponent(Gtk.Grid):
+
+    # Initialization
+
+    def __init__(self):
+        Gtk.Grid.__init__(self)
+
+        self.controller = None
+
+        self.set_name('simulator-component')
+        self.init_header_bar()
+        self.init_register_view()
+        self.init_memory_view()
+
+        GLib.timeout_add(1000 // 30, self.on_frame)
+
+    def init_header_bar(self):
+        self.header_bar = Gtk.HeaderBar()
+
+        self.header_bar.set_name('view-bar')
+        self.header_bar.set_title('Simulator')
+        self.header_bar.set_hexpand(True)
+        self.header_bar.set_show_close_button(False)
+
+        self.buttons = {}
+        button_box = Gtk.Box()
+        button_box.set_homogeneous(False)
+        button_box.set_spacing(4)
+
+        for name, value, tooltip, action in [('run', '', 'Run', self.run),
+                                             ('step', '', 'Step', self.step),
+                                             ('pause', '', 'Pause', self.pause),
+                                             ('stop', '', 'Stop', self.stop)]:
+            self.buttons[name] = make_button(value, tooltip, True, action)
+            button_box.pack_start(self.buttons[name], False, False, 0)
+
+        self.header_bar.pack_start(button_box)
+
+        self.attach(self.header_bar, 0, 0, 2, 1)
+
+    def init_register_view(self):
+        self.register_grid = Gtk.Grid()
+        self.register_grid.set_column_spacing(16)
+        self.register_labels = {}
+        self.register_values = {}
+
+        for i, name in enumerate(['PC', 'SR', 'R0', 'R1', 'R2', 'R3', 'R4', 'R5', 'R6', 'R7']):
+            self.register_labels[name] = Gtk.Label('00000000')
+            self.register_grid.attach(Gtk.Label(name), 0, i, 1, 1)
+            self.register_grid.attach(self.register_labels[name], 1, i, 1, 1)
+
+        self.status_label = Gtk.Label('')
+
+        self.attach(self.register_grid, 0, 1, 1, 1)
+        self.attach(self.status_label, 0, 2, 2, 1)
+
+    def init_memory_view(self):
+        self.memory_view = MemoryView()
+        self.attach(self.memory_view, 1, 1, 1, 1)
+
+    def set_simulator(self, simulator):
+        if self.controller is not None:
+            self.controller.stop()
+        self.controller = ExecutionController(simulator)
+        self.register_values = {}
+        self.memory_view.set_model(MemoryModel(simulator))
+
+    # Actions
+
+    def run(self, button=None):
+        if self.controller is not None:
+            self.controller.start()
+
+    def step(self, button=None):
+        if self.controller is not None:
+            self.controller.step()
+
+    def pause(self, button=None):
+        if self.controller is not None:
+            self.controller.pause()
+
+    def stop(self, button=None):
+        if self.controller is not None:
+            self.controller.stop()
+
+    # Events
+
+    def on_frame(self):
+        frame = self.controller.poll() if self.controller is not None else None
+        if frame is not None:
+            for name, value in frame['registers'].items():
+                if self.register_values.get(name) != value:
+                    self.register_values[name] = value
+                    self.register_labels[name].set_text(value)
+            self.memory_view.update(frame['changed_pages'])
+            status = '{} - {} cycles'.format(frame['state'].name.capitalize(), frame['cycle'])
+            if frame['breakpoint_hit'] is not None:
+                status += ' - breakpoint at {:08X}'.format(frame['breakpoint_hit'].address)
+            self.status_label.set_text(status)
+        return True
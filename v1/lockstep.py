@@ -0,0 +1,381 @@
+"""Lockstep differential execution of two FRISC simulator implementations
+
+Runs a reference and a candidate engine on the same program, comparing their
+registers, SR flags and the bytes each of them wrote to memory after every
+instruction, or every block of instructions, and stops at the first
+divergence with a diff of the two states. Engines:
+
+    scalar        - FRISCSimulator, one instruction at a time
+    fast_forward  - FRISCSimulator, run in blocks with delay loop fast-forwarding
+    vector        - FRISCVectorSimulator with a single lane
+
+Programs are either given as assembly sources, or generated at random from
+the opcode and condition tables of frisc_parsing, so that every instruction
+and condition code gets exercised. A generated program which diverges is
+saved to be replayed, into the --output directory, or a new temporary
+directory whose path is printed.
+
+Usage: python lockstep.py [program.a ...] [--reference scalar] [--candidate vector] [--block N]
+                          [--count N] [--length N] [--max-steps N] [--seed N] [--output DIR]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+from assemblers.frisc_assembler import FRISCAssembler
+from assemblers.frisc_disassembler import FRISCDisassembler
+from simulators.frisc_simulator import *
+from simulators.frisc_vector_simulator import FRISCVectorSimulator
+from utils.frisc_parsing import ALInstr, Condition, MemInstr, RetInstr, StackInstr, JumpInstr
+
+DEFAULT_MEMORY_SIZE = 65536
+DEFAULT_MAX_STEPS = 10000
+
+REGISTERS = ['PC', 'SR', 'R0', 'R1', 'R2', 'R3', 'R4', 'R5', 'R6', 'R7', 'IIF']
+
+FLAGS = ['N', 'C', 'V', 'Z', 'GIE']
+
+_MASK = 0xFFFFFFFF
+
+
+# Engines
+#
+# An engine loads a program, runs a given number of instructions at most, and
+# reports its status ('running', 'halted' or 'faulted'), its registers as
+# unsigned integers, single bytes of its memory, and the addresses it wrote
+# since it was last asked.
+
+class ScalarEngine:
+
+    def __init__(self, memory_size, fast_forward=False):
+        self.simulator = FRISCSimulator(memory_size)
+        self.simulator.fast_forward = fast_forward
+        self.simulator._write_memory = self._write_memory
+        self.single_steps = not fast_forward
+        self.writes = set()
+        self.faulted = False
+
+    def load(self, listing):
+        self.simulator.init()
+        self.simulator.load_listing(listing)
+        self.writes = set()
+        self.faulted = False
+
+    def run(self, count):
+        try:
+            if self.single_steps and count == 1:
+                self.simulator.run_step()
+            else:
+                self.simulator.run(count)
+        except Exception:
+            self.faulted = True
+
+    def status(self):
+        if self.faulted:
+            return 'faulted'
+        return 'halted' if self.simulator.state == SimulatorState.TERMINATED else 'running'
+
+    def registers(self):
+        registers = {name: int(value) & _MASK for name, value in self.simulator.registers.items()}
+        registers['IIF'] = int(self.simulator.flags['IIF'])
+        return registers
+
+    def read_byte(self, address):
+        return int(self.simulator.memory[address]) & 0xFF
+
+    def take_writes(self):
+        writes, self.writes = self.writes, set()
+        return writes
+
+    def _write_memory(self, address, value, size):
+        self.writes.update(range(address, address + size))
+        type(self.simulator)._write_memory(self.simulator, address, value, size)
+
+
+class VectorEngine:
+
+    _statuses = {
+        FRISCVectorSimulator.RUNNING: 'running',
+        FRISCVectorSimulator.HALTED: 'halted',
+        FRISCVectorSimulator.FAULTED: 'faulted'
+    }
+
+    def __init__(self, memory_size):
+        self.memory_size = memory_size
+        self.simulator = None
+        self.writes = set()
+
+    def load(self, listing):
+        self.simulator = FRISCVectorSimulator(self.memory_size, 1)
+        self.simulator._store = self._store
+        self.simulator.load_listing(listing)
+        self.writes = set()
+
+    def run(self, count):
+        self.simulator.run(count)
+
+    def status(self):
+        return self._statuses[int(self.simulator.status[0])]
+
+    def registers(self):
+        registers = {name: int(values[0]) & _MASK for name, values in self.simulator.registers.items()}
+        registers['IIF'] = int(self.simulator.iif[0])
+        return registers
+
+    def read_byte(self, address):
+        return int(self.simulator.memory[0, address])
+
+    def take_writes(self):
+        writes, self.writes = self.writes, set()
+        return writes
+
+    def _store(self, lanes, addresses, values, size):
+        result = FRISCVectorSimulator._store(self.simulator, lanes, addresses, values, size)
+        for address in addresses[result[1]]:
+            self.writes.update(range(int(address), int(address) + size))
+        return result
+
+
+ENGINES = {
+    'scalar': lambda memory_size: ScalarEngine(memory_size),
+    'fast_forward': lambda memory_size: ScalarEngine(memory_size, fast_forward=True),
+    'vector': VectorEngine
+}
+
+
+# Lockstep execution
+
+def compare(reference, candidate):
+    """Return the differences between the states of two engines, an empty dict if there are none"""
+    differences = {}
+    statuses = reference.status(), candidate.status()
+    if statuses[0] != statuses[1]:
+        differences['status'] = statuses
+
+    reference_writes, candidate_writes = reference.take_writes(), candidate.take_writes()
+    if 'faulted' in statuses:
+        # The state a fault leaves behind is not specified, only that it happens
+        return differences
+
+    reference_registers, candidate_registers = reference.registers(), candidate.registers()
+    registers = {name: (reference_registers[name], candidate_registers[name]) for name in REGISTERS
+                 if reference_registers[name] != candidate_registers[name]}
+    if registers:
+        differences['registers'] = registers
+
+    memory = {}
+    for address in sorted(reference_writes | candidate_writes):
+        written = address in reference_writes, address in candidate_writes
+        values = reference.read_byte(address), candidate.read_byte(address)
+        if written[0] != written[1] or values[0] != values[1]:
+            memory[address] = {'written': written, 'values': values}
+    if memory:
+        differences['memory'] = memory
+    return differences
+
+
+def run_lockstep(reference, candidate, listing, max_steps=DEFAULT_MAX_STEPS, block=1):
+    """Run two engines on the listing of a program, comparing them after every block of instructions
+
+    Returns None if they agree until both stop or max_steps instructions are
+    executed, otherwise the first divergence as a dict with the number of
+    instructions executed, the reference PC of the block, the instruction
+    there and the differences."""
+    reference.load(listing)
+    candidate.load(listing)
+
+    steps = 0
+    while steps < max_steps:
+        pc = reference.registers()['PC']
+        count = min(block, max_steps - steps)
+        reference.run(count)
+        candidate.run(count)
+        steps += count
+
+        differences = compare(reference, candidate)
+        if differences:
+            return {'steps': steps, 'pc': pc, 'instruction': _disassemble(reference, pc), 'differences': differences}
+        if reference.status() != 'running':
+            break
+    return None
+
+
+def _disassemble(engine, address):
+    try:
+        return FRISCDisassembler.disassemble_range([engine.read_byte(address + i) for i in range(4)], 0, 4)[0][2]
+    except IndexError:
+        return None
+
+
+def format_divergence(divergence):
+    """Format a divergence as a table of reference and candidate values, marking written bytes with *"""
+    lines = ['Divergence after {} instructions, block starting at PC {:08X}: {}'.format(
+                 divergence['steps'], divergence['pc'], divergence.get('instruction')),
+             '    {:<10}{:<11}{}'.format('', 'reference', 'candidate')]
+    differences = divergence['differences']
+    if 'status' in differences:
+        lines.append('    {:<10}{:<11}{}'.format('status', *differences['status']))
+    for name, (expected, actual) in differences.get('registers', {}).items():
+        lines.append('    {:<10}{:<11}{:08X}'.format(name, '{:08X}'.format(expected), actual))
+        if name == 'SR':
+            changed = expected ^ actual
+            lines.append('    {:<10}{}'.format('flags', ' '.join(flag for i, flag in enumerate(FLAGS) if changed & (1 << i))))
+    for address, difference in differences.get('memory', {}).items():
+        values = ['{:02X}{}'.format(value, '*' if written else '')
+                  for value, written in zip(difference['values'], difference['written'])]
+        lines.append('    {:<10}{:<11}{}'.format('{:08X}'.format(address), *values))
+    return '\n'.join(lines)
+
+
+# Random programs
+
+DATA_WORDS = 64
+
+STACK_TOP = 0x8000
+
+_sources = ['R{}'.format(i) for i in range(8)]
+
+_destinations = ['R{}'.format(i) for i in range(6)]
+
+_conditions = [''] + ['_' + condition for condition in sorted(Condition._codes)]
+
+
+def _immediate(generator, bits=20):
+    value = generator.randrange(-(1 << (bits - 1)), 1 << (bits - 1))
+    return '{}0{:X}'.format('-' if value < 0 else '', abs(value))
+
+
+def _alu_instruction(generator, labels):
+    name = generator.choice(sorted(ALInstr._opcodes))
+    if name in ('SHL', 'SHR', 'ASHR', 'ROTL', 'ROTR') and generator.random() < 0.5:
+        operand = '0{:X}'.format(generator.randrange(40))
+    else:
+        operand = generator.choice(_sources) if generator.random() < 0.5 else _immediate(generator)
+    if name == 'CMP':
+        return ['CMP {}, {}'.format(generator.choice(_sources), operand)]
+    return ['{} {}, {}, {}'.format(name, generator.choice(_sources), operand, generator.choice(_destinations))]
+
+
+def _move_instruction(generator, labels):
+    source = generator.choice(_sources + ['SR', _immediate(generator), 'L{}'.format(generator.randrange(labels))])
+    destination = generator.choice(_destinations + ['SR'])
+    return ['MOVE {}, {}'.format(source, destination)]
+
+
+def _memory_instruction(generator, labels):
+    name = generator.choice(sorted(MemInstr._opcodes))
+    register = generator.choice(_destinations if name.startswith('LOAD') else _sources)
+    address = generator.choice(['(R6)', '(R6+0{:X})'.format(generator.randrange(4 * DATA_WORDS)),
+                                '(DATA)', '(0{:X})'.format(generator.randrange(4 * DATA_WORDS))])
+    return ['{} {}, {}'.format(name, register, address)]
+
+
+def _stack_instruction(generator, labels):
+    name = generator.choice(sorted(StackInstr._opcodes))
+    return ['{} {}'.format(name, generator.choice(_sources if name == 'PUSH' else _destinations))]
+
+
+def _jump_instruction(generator, labels):
+    name = generator.choice(sorted(JumpInstr._opcodes) + ['JR'])
+    condition = generator.choice(_conditions)
+    target = 'L{}'.format(generator.randrange(labels))
+    if name != 'JR' and generator.random() < 0.2:
+        return ['MOVE {}, R5'.format(target), '{}{} (R5)'.format(name, condition)]
+    return ['{}{} {}'.format(name, condition, target)]
+
+
+def _return_instruction(generator, labels):
+    name = generator.choice(sorted(RetInstr._opcodes))
+    condition = generator.choice(_conditions)
+    if name == 'HALT' and not condition:
+        condition = '_' + generator.choice(sorted(Condition._codes))
+    return ['{}{}'.format(name, condition)]
+
+
+_GENERATORS = [
+    (_alu_instruction, 8),
+    (_move_instruction, 3),
+    (_memory_instruction, 4),
+    (_stack_instruction, 2),
+    (_jump_instruction, 3),
+    (_return_instruction, 1)
+]
+
+
+def generate_program(length, seed=0):
+    """Generate a random program of about a given number of instructions
+
+    Instructions are drawn from the grammar's opcode and condition tables.
+    R6 points to a data area of random words, which all memory accesses
+    stay within, R7 is a stack pointer and the others are free."""
+    generator = random.Random(seed)
+    generators = [function for function, weight in _GENERATORS for _ in range(weight)]
+
+    source = ['        MOVE 0{:X}, SP'.format(STACK_TOP), '        MOVE DATA, R6']
+    for i in range(length):
+        instructions = generator.choice(generators)(generator, length)
+        source.append('{:<8}{}'.format('L{}'.format(i), instructions[0]))
+        source += ['        ' + instruction for instruction in instructions[1:]]
+    source.append('        HALT')
+
+    source.append('DATA    DW ' + ', '.join(_immediate(generator, 32) for _ in range(DATA_WORDS // 2)))
+    source.append('        DW ' + ', '.join(_immediate(generator, 32) for _ in range(DATA_WORDS // 2)))
+    return '\n'.join(source) + '\n'
+
+
+def assemble(source, name):
+    """Assemble a program in memory and return its listing"""
+    result = FRISCAssembler.assemble_source(source)
+    if not result.success:
+        raise ValueError('Cannot assemble {}, {} in line {}'.format(name, result.diagnostics[0][1], result.diagnostics[0][0]))
+    return result.listing
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run two FRISC simulators in lockstep and report the first divergence')
+    parser.add_argument('programs', nargs='*', help='assembly sources to run, random programs are generated if none are given')
+    parser.add_argument('--reference', choices=sorted(ENGINES), default='scalar', help='reference engine')
+    parser.add_argument('--candidate', choices=sorted(ENGINES), default='vector', help='engine checked against the reference')
+    parser.add_argument('--block', type=int, default=1, help='number of instructions executed between comparisons')
+    parser.add_argument('--count', type=int, default=100, help='number of random programs')
+    parser.add_argument('--length', type=int, default=200, help='number of instructions of random programs')
+    parser.add_argument('--max-steps', type=int, default=DEFAULT_MAX_STEPS, help='instructions to run each program for')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first random program')
+    parser.add_argument('--output', help='directory to save diverging random programs to, a new temporary one by default')
+    arguments = parser.parse_args()
+
+    reference = ENGINES[arguments.reference](DEFAULT_MEMORY_SIZE)
+    candidate = ENGINES[arguments.candidate](DEFAULT_MEMORY_SIZE)
+
+    if arguments.programs:
+        programs = [(name, None) for name in arguments.programs]
+    else:
+        programs = [('random_{}.a'.format(seed), seed) for seed in range(arguments.seed, arguments.seed + arguments.count)]
+
+    for name, seed in programs:
+        if seed is None:
+            with open(name) as file:
+                source = file.read()
+        else:
+            source = generate_program(arguments.length, seed)
+
+        listing = assemble(source, name)
+        divergence = run_lockstep(reference, candidate, listing, arguments.max_steps, arguments.block)
+        if divergence is not None:
+            if seed is not None:
+                output = arguments.output or tempfile.mkdtemp(prefix='lockstep_')
+                os.makedirs(output, exist_ok=True)
+                name = os.path.join(output, name)
+                with open(name, 'w') as file:
+                    file.write(source)
+            print('{}: {} and {} diverge'.format(name, arguments.reference, arguments.candidate))
+            print(format_divergence(divergence))
+            sys.exit(1)
+
+    print('{} programs, no divergence'.format(len(programs)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+from collections import namedtuple
+
+SourceLine = namedtuple('SourceLine', ['line_number', 'address', 'word', 'text', 'label', 'kind'])
+
+LabelCoverage = namedtuple('LabelCoverage', ['label', 'line_number', 'executed', 'instructions', 'branches_covered', 'branches'])
+
+_BRANCH_OPCODES = (0b11000, 0b11001, 0b11010, 0b11011, 0b11111)
+
+_DATA_MNEMONICS = ('DW', 'DH', 'DB')
+
+
+class Coverage:
+    """Executed instruction addresses and conditional branch directions
+
+    Executed addresses are kept in a bitmap with one bit per word address, and
+    every conditional branch maps to the directions it went, a bitwise or of
+    NOT_TAKEN and TAKEN, so recording costs a couple of bit operations per
+    instruction. Reports map both back to source lines through the listing of
+    the program, the contents of its .p file."""
+
+    NOT_TAKEN, TAKEN = 1, 2
+
+    def __init__(self, memory_size):
+        self.bitmap = bytearray((memory_size // 4 + 7) // 8)
+        self.branches = {}
+
+    def reset(self):
+        self.bitmap = bytearray(len(self.bitmap))
+        self.branches = {}
+
+    def merge(self, other):
+        """Add the coverage of another run of the same program, such as another test vector"""
+        if len(other.bitmap) > len(self.bitmap):
+            self.bitmap.extend(bytes(len(other.bitmap) - len(self.bitmap)))
+        for i, byte in enumerate(other.bitmap):
+            if byte:
+                self.bitmap[i] |= byte
+        for address, directions in other.branches.items():
+            self.branches[address] = self.branches.get(address, 0) | directions
+
+    def is_executed(self, address):
+        return bool(self.bitmap[address >> 5] & (1 << ((address >> 2) & 7)))
+
+    def executed_addresses(self):
+        return [(i << 5) | (bit << 2) for i, byte in enumerate(self.bitmap) if byte for bit in range(8) if byte & (1 << bit)]
+
+    # Reports
+
+    def line_coverage(self, listing):
+        """Return (source line, executed, branch directions) for every source line
+
+        Executed is None for lines which are not instructions, and branch
+        directions are None for lines which are not conditional branches."""
+        coverage = []
+        for line in source_lines(listing):
+            if line.kind != 'code':
+                coverage.append((line, None, None))
+                continue
+
+            directions = None
+            if _is_conditional_branch(line.word):
+                directions = self.branches.get(line.address, 0)
+            coverage.append((line, self.is_executed(line.address), directions))
+        return coverage
+
+    def label_coverage(self, listing):
+        """Return the coverage of the instructions following every label, up to the next one"""
+        summaries = []
+        for line, executed, directions in self.line_coverage(listing):
+            if line.label is not None and line.kind != 'constant':
+                summaries.append([line.label, line.line_number, 0, 0, 0, 0])
+            if executed is None or not summaries:
+                continue
+
+            summary = summaries[-1]
+            summary[2] += executed
+            summary[3] += 1
+            if directions is not None:
+                summary[4] += bin(directions).count('1')
+                summary[5] += 2
+        return [LabelCoverage(*summary) for summary in summaries if summary[3]]
+
+    def summary(self, listing):
+        """Return the numbers of executed and all instructions, and of covered and all branch directions"""
+        executed = instructions = branches_covered = branches = 0
+        for line, line_executed, directions in self.line_coverage(listing):
+            if line_executed is not None:
+                executed += line_executed
+                instructions += 1
+            if directions is not None:
+                branches_covered += bin(directions).count('1')
+                branches += 2
+        return {'executed': executed, 'instructions': instructions, 'branches_covered': branches_covered, 'branches': branches}
+
+    def format_text(self, listing):
+        """Format the source annotated with execution and branch marks, followed by a summary per label
+
+        Executed lines are marked with 1, lines never executed with #####, and
+        conditional branches list the directions they took."""
+        lines = []
+        for line, executed, directions in self.line_coverage(listing):
+            mark = '-' if executed is None else '1' if executed else '#####'
+            branch = ''
+            if directions is not None:
+                branch = '    [taken: {}, not taken: {}]'.format('yes' if directions & self.TAKEN else 'no',
+                                                                  'yes' if directions & self.NOT_TAKEN else 'no')
+            lines.append('{:>6}:{:>6}: {}{}'.format(mark, line.line_number, line.text, branch))
+
+        lines.append('')
+        lines.append('{:<24}{:>14}{:>14}'.format('Label', 'Instructions', 'Branches'))
+        for summary in self.label_coverage(listing):
+            lines.append('{:<24}{:>14}{:>14}'.format(summary.label, '{}/{}'.format(summary.executed, summary.instructions),
+                                                      '{}/{}'.format(summary.branches_covered, summary.branches)))
+        return '\n'.join(lines) + '\n'
+
+    def format_lcov(self, listing, source_file_name, test_name=''):
+        """Format the coverage as an LCOV tracefile record, with labels as functions"""
+        records = ['TN:' + test_name, 'SF:' + source_file_name]
+        labels = self.label_coverage(listing)
+        for summary in labels:
+            records.append('FN:{},{}'.format(summary.line_number, summary.label))
+        for summary in labels:
+            records.append('FNDA:{},{}'.format(int(summary.executed > 0), summary.label))
+        records.append('FNF:{}'.format(len(labels)))
+        records.append('FNH:{}'.format(sum(summary.executed > 0 for summary in labels)))
+
+        found = hit = branches_found = branches_hit = 0
+        branch_records = []
+        for line, executed, directions in self.line_coverage(listing):
+            if executed is None:
+                continue
+            records.append('DA:{},{}'.format(line.line_number, int(executed)))
+            found += 1
+            hit += executed
+            if directions is not None:
+                for branch, direction in enumerate((self.TAKEN, self.NOT_TAKEN)):
+                    taken = ('1' if directions & direction else '0') if executed else '-'
+                    branch_records.append('BRDA:{},0,{},{}'.format(line.line_number, branch, taken))
+                    branches_found += 1
+                    branches_hit += taken == '1'
+
+        records += branch_records
+        records += ['BRF:{}'.format(branches_found), 'BRH:{}'.format(branches_hit),
+                    'LF:{}'.format(found), 'LH:{}'.format(hit), 'end_of_record']
+        return '\n'.join(records) + '\n'
+
+
+def source_lines(listing):
+    """Yield a SourceLine for every line of the source a listing was assembled from
+
+    Kind is 'code' for instructions, 'data' for data pseudo instructions, and
+    'constant' for EQU, while blank and other lines have no kind."""
+    line_number = 0
+    for entry in listing:
+        address, code, text = entry[:10].strip(), entry[10:23].strip(), entry[23:].rstrip('\n')
+        if not address and code:
+            continue                        # Further words of a data pseudo instruction
+
+        line_number += 1
+        source = text.split(';', maxsplit=1)[0]
+        words = source.split()
+        label = words.pop(0) if words and not source[0].isspace() else None
+        mnemonic = words[0].upper() if words else None
+
+        kind = None
+        if mnemonic == 'EQU':
+            kind = 'constant'
+        elif address:
+            kind = 'data' if mnemonic in _DATA_MNEMONICS else 'code'
+
+        word = int.from_bytes(bytes.fromhex(code), 'little') if address else None
+        yield SourceLine(line_number, int(address, 16) if address else None, word, text,
+                         label.upper() if label else None, kind)
+
+
+def _is_conditional_branch(word):
+    return word >> 27 in _BRANCH_OPCODES and (word >> 22) & 0xF != 0
@@ -0,0 +1,168 @@
+from abc import ABCMeta, abstractmethod
+from bisect import bisect_right, insort
+
+
+class Device(metaclass=ABCMeta):
+    """Abstract base class for a memory-mapped IO device
+
+    Devices are attached to a DeviceBus over an address range, and receive
+    offsets relative to the start of that range. Values are passed around as
+    unsigned integers, size is given in bytes.
+
+    Writes to buffered devices are delivered in batches, devices whose
+    behaviour depends on the exact moment of a write should set buffered to
+    False."""
+
+    buffered = True
+    simulator = None
+
+    def connect(self, simulator):
+        """Called when the device is attached to a simulator"""
+        self.simulator = simulator
+
+    @abstractmethod
+    def read(self, offset, size):
+        pass
+
+    @abstractmethod
+    def write(self, offset, value, size):
+        pass
+
+    def write_batch(self, writes):
+        """Handle a list of buffered (offset, value, size) writes, in order
+
+        Override if a device can process a whole batch faster than one by one"""
+        for offset, value, size in writes:
+            self.write(offset, value, size)
+
+    def reset(self):
+        pass
+
+
+class Port(Device):
+    """A simple parallel port, such as a bank of LEDs or switches
+
+    Reads return the last value written (or set from the outside), every
+    write is also kept in a history list."""
+
+    def __init__(self, value=0):
+        self.value = value
+        self.history = []
+
+    def read(self, offset, size):
+        return self.value & ((1 << 8 * size) - 1)
+
+    def write(self, offset, value, size):
+        self.value = value
+        self.history.append(value)
+
+    def write_batch(self, writes):
+        self.history.extend(value for offset, value, size in writes)
+        self.value = writes[-1][1]
+
+    def reset(self):
+        self.value = 0
+        self.history = []
+
+
+class DeviceBus:
+    """Dispatches memory accesses to devices through a sorted range index
+
+    Writes are buffered per device and delivered in batches, either when a
+    batch fills up, when the device is read from, or when the bus is flushed."""
+
+    def __init__(self, batch_size=64):
+        self.batch_size = batch_size
+        self.ranges = []
+        self.starts = []
+        self.pending = {}
+        self.accesses = 0
+
+    def attach(self, device, start, end):
+        """Attach a device over an inclusive address range"""
+        if end < start:
+            raise ValueError('Invalid address range for a device')
+        if any(start <= r_end and r_start <= end for r_start, r_end, _ in self.ranges):
+            raise ValueError('Device address range overlaps with an already attached device')
+
+        insort(self.ranges, (start, end, device))
+        self.starts = [r[0] for r in self.ranges]
+
+    def detach(self, device):
+        self.flush()
+        self.ranges = [r for r in self.ranges if r[2] is not device]
+        self.starts = [r[0] for r in self.ranges]
+
+    def find(self, address):
+        """Return a (start, device) pair for a given address, or None if unmapped"""
+        i = bisect_right(self.starts, address) - 1
+        if i >= 0 and address <= self.ranges[i][1]:
+            return self.ranges[i][0], self.ranges[i][2]
+        return None
+
+    def pages(self, offset_bits):
+        return {page for start, end, _ in self.ranges for page in range(start >> offset_bits, (end >> offset_bits) + 1)}
+
+    def read(self, address, size):
+        self.accesses += 1
+        start, device = self.find(address)
+        if device in self.pending:
+            self._flush_device(device)
+        return device.read(address - start, size)
+
+    def write(self, address, value, size):
+        self.accesses += 1
+        start, device = self.find(address)
+        if not device.buffered:
+            device.write(address - start, value, size)
+            return
+
+        writes = self.pending.setdefault(device, [])
+        writes.append((address - start, value, size))
+        if len(writes) >= self.batch_size:
+            self._flush_device(device)
+
+    def flush(self):
+        for device in list(self.pending):
+            self._flush_device(device)
+
+    def reset(self):
+        self.pending = {}
+        for _, _, device in self.ranges:
+            device.reset()
+
+    def _flush_device(self, device):
+        device.write_batch(self.pending.pop(device))
+
+
+class InterruptController:
+    """Keeps track of interrupt requests raised by devices, per interrupt line
+
+    pending is a plain attribute, so that a processor can test it once per
+    instruction, and only look at individual lines when it is set."""
+
+    def __init__(self):
+        self.requests = {}
+        self.pending = False
+
+    def request(self, line, source):
+        self.requests.setdefault(line, []).append(source)
+        self.pending = True
+
+    def clear(self, line, source):
+        sources = self.requests.get(line, [])
+        if source in sources:
+            sources.remove(source)
+        self.pending = any(self.requests.values())
+
+    def acknowledge(self, line):
+        """Drop all requests on a line, used for edge-triggered lines"""
+        self.requests[line] = []
+        self.pending = any(self.requests.values())
+
+    def is_requested(self, line):
+        return bool(self.requests.get(line))
+
+    def reset(self):
+        self.requests = {}
+        self.pending = False
@@ -0,0 +1,108 @@
+import threading
+import time
+
+from simulators.simulator import SimulatorState
+
+
+class ExecutionController:
+    """Runs a simulator on a background thread, so that a user interface stays responsive
+
+    The worker thread executes the program in chunks of chunk_size instructions,
+    checking for pause and stop requests between them. Instead of notifying the
+    interface after every instruction, it keeps only the latest state frame,
+    and refreshes it at most frame_rate times a second. The interface thread
+    collects frames with poll, at its own pace, so intermediate frames are
+    coalesced and simply dropped. Every frame lists the memory pages changed
+    since the previous polled one."""
+
+    def __init__(self, simulator, chunk_size=2000, frame_rate=30):
+        self.simulator = simulator
+        self.chunk_size = chunk_size
+        self.frame_interval = 1 / frame_rate
+        self.lock = threading.Lock()
+        self.pause_requested = threading.Event()
+        self.stop_requested = threading.Event()
+        self.thread = None
+        self.frame = None
+        self.frame_version = 0
+        self.polled_version = 0
+
+    # Actions, called from the interface thread
+
+    def start(self):
+        """Start running in the background, unless already running"""
+        if self.is_running() or self.simulator.state not in (SimulatorState.LOADED, SimulatorState.PAUSED):
+            return
+
+        self.pause_requested.clear()
+        self.stop_requested.clear()
+        self.thread = threading.Thread(target=self._run, name='simulator', daemon=True)
+        self.thread.start()
+
+    def step(self):
+        """Execute a single instruction, if not already running in the background"""
+        if self.is_running():
+            return
+
+        with self.lock:
+            self.simulator.run_step()
+            self._publish()
+
+    def pause(self):
+        self.pause_requested.set()
+
+    def stop(self):
+        """Terminate the program, the worker thread stops at the end of its current chunk"""
+        if self.is_running():
+            self.stop_requested.set()
+        else:
+            with self.lock:
+                self.simulator.stop()
+                self._publish()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def poll(self):
+        """Return the latest state frame if it changed since the last poll, otherwise None"""
+        if self.frame_version == self.polled_version:
+            return None
+        self.polled_version = self.frame_version
+        return self.frame
+
+    # Worker thread
+
+    def _run(self):
+        last_frame = 0
+        with self.lock:
+            while not (self.pause_requested.is_set() or self.stop_requested.is_set()):
+                self.simulator.run(self.chunk_size)
+                if (self.simulator.state == SimulatorState.TERMINATED or self.simulator.watchpoint_hit is not None or
+                        self.simulator.breakpoint_hit is not None):
+                    break
+
+                now = time.monotonic()
+                if now - last_frame >= self.frame_interval:
+                    self._publish(SimulatorState.RUNNING)
+                    last_frame = now
+
+            if self.stop_requested.is_set():
+                self.simulator.stop()
+            self._publish()
+
+    def _publish(self, state=None):
+        simulator = self.simulator
+        changed_pages = simulator.take_changed_pages()
+        if self.frame is not None and self.frame_version != self.polled_version:
+            # The previous frame was dropped, so its changes are carried over
+            changed_pages |= self.frame['changed_pages']
+
+        self.frame = {
+            'state': state or simulator.state,
+            'cycle': simulator.cycle,
+            'registers': {name: value.to_hex_string() for name, value in simulator.registers.items()},
+            'changed_pages': changed_pages,
+            'watchpoint_hit': simulator.watchpoint_hit,
+            'breakpoint_hit': simulator.breakpoint_hit
+        }
+        self.frame_version += 1
@@ -0,0 +1,206 @@
+from simulators.devices import Device
+
+
+class FRISCDevice(Device):
+    """Base class for FRISC peripheral units
+
+    All units share the same register layout conventions: a status register
+    whose write acknowledges the interrupt (IACK), and an END register written
+    at the end of an interrupt routine. Units are connected either to the INT
+    or to the NMI line, or to none if interrupt is None."""
+
+    buffered = False
+
+    def __init__(self, interrupt='INT'):
+        self.interrupt = interrupt
+        self.control = 0
+        self.ready = False
+        self.requesting = False
+        self.event = None
+
+    def reset(self):
+        self.control = 0
+        self.ready = False
+        self.requesting = False
+        self.event = None
+
+    def _signal_ready(self):
+        self.ready = True
+        if self.control & self._interrupt_enable_mask and self.interrupt is not None and not self.requesting:
+            self.requesting = True
+            self.simulator.interrupts.request(self.interrupt, self)
+
+    def _acknowledge(self):
+        self.ready = False
+        if self.requesting:
+            self.requesting = False
+            self.simulator.interrupts.clear(self.interrupt, self)
+
+    def _cancel(self):
+        if self.event is not None:
+            self.simulator.cancel_event(self.event)
+            self.event = None
+
+
+class FRISCCounter(FRISCDevice):
+    """FRISC CT (counter/timer) unit, counting processor cycles
+
+    Registers: 0 - LR (count constant, reads return the current count), 4 - CR
+    (bit 0 starts counting, bit 1 enables interrupts), 8 - SR on read (bit 0 set
+    when the count reached zero) and IACK on write, 12 - END.
+
+    The count is not ticked every cycle, reaching zero is scheduled as an event
+    on the simulator event queue instead."""
+
+    _interrupt_enable_mask = 2
+
+    def __init__(self, interrupt='INT'):
+        super().__init__(interrupt)
+        self.constant = 0
+        self.started_at = 0
+
+    def reset(self):
+        super().reset()
+        self.constant = 0
+        self.started_at = 0
+
+    def read(self, offset, size):
+        if offset == 0:
+            if self.event is None or not self.constant:
+                return self.constant
+            return self.constant - (self.simulator.cycle - self.started_at) % self.constant
+        elif offset == 4:
+            return self.control
+        elif offset == 8:
+            return int(self.ready)
+        return 0
+
+    def write(self, offset, value, size):
+        if offset == 0:
+            self.constant = value
+            self._restart()
+        elif offset == 4:
+            self.control = value
+            self._restart()
+        elif offset == 8:
+            self._acknowledge()
+
+    def _restart(self):
+        self._cancel()
+        if self.control & 1 and self.constant > 0:
+            self.started_at = self.simulator.cycle
+            self.event = self.simulator.schedule(self.constant, self._expire)
+
+    def _expire(self):
+        # Events can be processed a few cycles late under a timing model, the next expiry is kept exact
+        self.started_at = self.event[0]
+        self.event = self.simulator.schedule(self.started_at + self.constant - self.simulator.cycle, self._expire)
+        self._signal_ready()
+
+
+class FRISCParallel(FRISCDevice):
+    """FRISC PIO (parallel input/output) unit
+
+    Registers: 0 - DR (data), 4 - CR (bit 0 enables interrupts), 8 - SR on read
+    (bit 0 set when the unit is ready) and IACK on write, 12 - END.
+
+    Input values from the outside world are fed with put, optionally after a
+    delay in cycles. Output values written to DR are collected in outputs, and
+    the unit becomes ready again after output_delay cycles."""
+
+    _interrupt_enable_mask = 1
+
+    def __init__(self, interrupt='INT', output_delay=1):
+        super().__init__(interrupt)
+        self.output_delay = output_delay
+        self.data = 0
+        self.outputs = []
+
+    def reset(self):
+        super().reset()
+        self.data = 0
+        self.outputs = []
+
+    def put(self, value, delay=0):
+        """Present a value on the unit's input, after a given number of cycles"""
+        self.simulator.schedule(delay, self._deliver, value)
+
+    def read(self, offset, size):
+        if offset == 0:
+            return self.data & ((1 << 8 * size) - 1)
+        elif offset == 4:
+            return self.control
+        elif offset == 8:
+            return int(self.ready)
+        return 0
+
+    def write(self, offset, value, size):
+        if offset == 0:
+            self.data = value
+            self.outputs.append(value)
+            self.ready = False
+            self._cancel()
+            self.event = self.simulator.schedule(self.output_delay, self._output_done)
+        elif offset == 4:
+            self.control = value
+        elif offset == 8:
+            self._acknowledge()
+
+    def _deliver(self, value):
+        self.data = value
+        self._signal_ready()
+
+    def _output_done(self):
+        self.event = None
+        self._signal_ready()
+
+
+class FRISCDMA(FRISCDevice):
+    """FRISC DMA (direct memory access) unit
+
+    Registers: 0 - source address, 4 - destination address, 8 - word count,
+    12 - CR (bit 0 enables interrupts, bit 1 keeps the source address fixed,
+    bit 2 keeps the destination address fixed), 16 - START on write, 20 - SR on
+    read (bit 0 set when the transfer is done) and IACK on write, 24 - END.
+
+    A transfer takes cycles_per_word cycles for each word, and is carried out
+    by a single event scheduled at its end."""
+
+    _interrupt_enable_mask = 1
+
+    def __init__(self, interrupt='INT', cycles_per_word=1):
+        super().__init__(interrupt)
+        self.cycles_per_word = cycles_per_word
+        self.source = self.destination = self.count = 0
+
+    def reset(self):
+        super().reset()
+        self.source = self.destination = self.count = 0
+
+    def read(self, offset, size):
+        return {0: self.source, 4: self.destination, 8: self.count, 12: self.control, 20: int(self.ready)}.get(offset, 0)
+
+    def write(self, offset, value, size):
+        if offset == 0:
+            self.source = value
+        elif offset == 4:
+            self.destination = value
+        elif offset == 8:
+            self.count = value
+        elif offset == 12:
+            self.control = value
+        elif offset == 16:
+            self.ready = False
+            self._cancel()
+            self.event = self.simulator.schedule(self.count * self.cycles_per_word, self._transfer)
+        elif offset == 20:
+            self._acknowledge()
+
+    def _transfer(self):
+        self.event = None
+        source, destination = self.source, self.destination
+        for _ in range(self.count):
+            self.simulator.set_word_in_memory(destination, self.simulator.get_word_from_memory(source))
+            source += 0 if self.control & 2 else 4
+            destination += 0 if self.control & 4 else 4
+        self._signal_ready()
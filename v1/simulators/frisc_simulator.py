@@ -1,4 +1,5 @@
 from simulators.simulator import *
+from simulators.timing import TimingModel
 from utils.binary import *
 from utils.helpers import match_binary_mask
 
@@ -6,9 +7,12 @@ from utils.helpers import match_binary_mask
 class FRISCSimulator(Simulator):
     """FRISC processor simulator, extending abstract class Simulator
 
-    IO units are not supported yet."""
+    IO units are supported as memory-mapped devices, see Simulator.attach_device."""
+
+    register_aliases = {'SP': 'R7'}
 
     def __init__(self, memory_size):
+        super().__init__()
         self.config['MEMORY_SIZE_BYTES'] = memory_size
         self.config['MEMORY_SIZE_WORDS'] = memory_size // self.config['WORD_SIZE_BYTES']
 
@@ -17,20 +21,46 @@ class FRISCSimulator(Simulator):
     # State procedures
 
     def init(self):
-        self.memory = [Binary8(0)] * self.config['MEMORY_SIZE_BYTES']
-        self.annotations = [''] * self.config['MEMORY_SIZE_BYTES']
+        self.clear_memory()
         self.registers = {name: Binary32(0) for name in ['PC', 'SR', 'R0', 'R1', 'R2', 'R3', 'R4', 'R5', 'R6', 'R7']}
         self.flags = {'IIF': True}
+        self.breakpoint_hit = None
+        self.reset_devices()
 
         self.state = SimulatorState.INITIALIZED
 
+    @classmethod
+    def timing_model(cls, default_wait_states=0):
+        """Return a timing model with FRISC instruction cycle counts, to which
+        slower memory regions can be added, see Simulator.enable_timing"""
+        return TimingModel(cls._instruction_cycles, 3, default_wait_states)
+
     # Execution procedures
 
     def execute_single(self):
-        instruction = self.get_word_from_memory(self.registers['PC'])
+        if self.cycle >= self.next_event_cycle:
+            self.process_events()
+
+        self.cycle += 1
+        if self.interrupts.pending and self.accept_interrupt():
+            if self.timing is not None:
+                self.cycle += self.timing.interrupt_cycles - 1
+            return
+
+        self.instruction_address = self.registers['PC']
+        instruction = self.fetch_word_from_memory(self.instruction_address)
         self.registers['PC'] += 4
 
         self.execute_instruction(instruction)
+        if self.timing is not None:
+            self.cycle += self.timing.instruction_cost(''.join(instruction[0:5])) - 1
+
+    def branch_taken(self, instruction):
+        opcode = ''.join(instruction[0:5])
+        condition = ''.join(instruction[6:10])
+        if opcode not in self._branch_opcodes or condition == '0000' or condition not in self._conditions:
+            return None
+        return self._conditions[condition](self.get_status_flags())
 
     def execute_instruction(self, instruction):
         opcode = ''.join(instruction[0:5])
@@ -52,7 +82,7 @@ class FRISCSimulator(Simulator):
             if source1_register != 'R0':
                 if instruction[10] == '1':
                     destination_register = 'SR'
-                if instruction[13] == '1':
+                if instruction[11] == '1':
                     operand2 = self.registers['SR']
 
             self.registers[destination_register] = operand2
@@ -72,13 +102,13 @@ class FRISCSimulator(Simulator):
             if opcode == '10000':
                 self.registers[destination_register] = self.pop_from_stack()
             elif opcode == '10001':
-                self.push_to_stack(self.registers[destination_register])
+                self.push_on_stack(self.registers[destination_register])
             elif opcode == '10010':
-                self.registers[destination_register] = self.get_byte_from_memory(address)
+                self.registers[destination_register] = Binary32.from_digits(self.get_byte_from_memory(address).digits)
             elif opcode == '10011':
                 self.set_byte_in_memory(address, self.registers[destination_register][24:])
             elif opcode == '10100':
-                self.registers[destination_register] = self.get_halfword_from_memory(self._round_to_halfword(address))
+                self.registers[destination_register] = Binary32.from_digits(self.get_halfword_from_memory(self._round_to_halfword(address)).digits)
             elif opcode == '10101':
                 self.set_halfword_in_memory(self._round_to_halfword(address), self.registers[destination_register][16:])
             elif opcode == '10110':
@@ -88,29 +118,112 @@ class FRISCSimulator(Simulator):
             else:
                 raise ValueError('Unknown memory operation, cannot execute')
 
-        elif opcode[:2] == '11' and self._conditions[condition](self.get_status_flags()):
-
-            if opcode == '11000':
-                self.registers['PC'] = operand2
-            elif opcode == '11001':
-                self.push_on_stack(self.registers['PC'])
-                self.registers['PC'] = operand2
-            elif opcode == '11010':
-                self.registers['PC'] += immediate
-            elif opcode == '11011':
-                self.registers['PC'] = self.pop_from_stack()
-                if return_type == '01':
-                    self.registers['SR'][27] = '1'
-                elif return_type == '11':
-                    self.flags['IIF'] = True
-            elif opcode == '11111':
-                self.state = SimulatorState.TERMINATED
+        elif opcode[:2] == '11':
+            if self._conditions[condition](self.get_status_flags()):
+                if opcode == '11000':
+                    self.registers['PC'] = operand2
+                    if self.step_budget:
+                        self._fast_forward_loop()
+                elif opcode == '11001':
+                    self.push_on_stack(self.registers['PC'])
+                    self.registers['PC'] = operand2
+                elif opcode == '11010':
+                    self.registers['PC'] += immediate
+                    if self.step_budget:
+                        self._fast_forward_loop()
+                elif opcode == '11011':
+                    self.registers['PC'] = self.pop_from_stack()
+                    if return_type == '01':
+                        self._set_status_bit(27, '1')
+                    elif return_type == '11':
+                        self.flags['IIF'] = True
+                elif opcode == '11111':
+                    self.state = SimulatorState.TERMINATED
 
         else:
             raise ValueError('Unknown instruction, cannot execute')
 
+    def accept_interrupt(self):
+        """Accept a pending interrupt, if the processor currently allows it
+
+        NMI is accepted while IIF is set and jumps to address 0x0C, INT is accepted
+        while GIE (SR bit 4) is set and jumps to the address stored at 0x08.
+        Accepting an interrupt takes a cycle of its own, returns the line of the
+        accepted interrupt, or None."""
+        if self.flags['IIF'] and self.interrupts.is_requested('NMI'):
+            self.interrupts.acknowledge('NMI')
+            self.flags['IIF'] = False
+            self.push_on_stack(self.registers['PC'])
+            self.registers['PC'] = Binary32(0x0C)
+            return 'NMI'
+        elif self.registers['SR'][27] == '1' and self.interrupts.is_requested('INT'):
+            self._set_status_bit(27, '0')
+            self.push_on_stack(self.registers['PC'])
+            self.registers['PC'] = Binary32.from_digits(self.get_word_from_memory(Binary32(0x08)).digits)
+            return 'INT'
+        return None
+
+    def _fast_forward_loop(self):
+        """Skip iterations of a delay loop which only counts a register down to zero
+
+        Recognises loops of an ADD or SUB of 1 or -1 to a register, followed by
+        a JP_NZ or JR_NZ back to it, and is called right after the jump back.
+        Skipped iterations stop short of the last one, and of the next event
+        cycle, so that event processing and interrupts happen exactly as they
+        would have otherwise."""
+        if not self.fast_forward or self.undo_log is not None or self.interrupts.pending:
+            return
+
+        loop_address = self._to_address(self.registers['PC'])
+        branch_address = self._to_address(self.instruction_address)
+        if (branch_address != loop_address + 4 or loop_address in self.breakpoints or branch_address in self.breakpoints or
+                loop_address in self.probes or branch_address in self.probes):
+            return
+
+        branch = type(self).fetch_word_from_memory(self, branch_address)
+        counter = type(self).fetch_word_from_memory(self, loop_address)
+        opcode = ''.join(counter[0:5])
+        if (''.join(branch[6:10]) != '1000' or opcode not in ('00100', '00110') or counter[5] != '1' or
+                counter[6:9] != counter[9:12]):
+            return
+
+        immediate = Binary32.from_digits(counter[12:], True)
+        step = int(immediate) if opcode == '00100' else -int(immediate)
+        if step not in (1, -1):
+            return
+
+        register = self._register(''.join(counter[6:9]))
+        value = int(self.registers[register]) & 0xFFFFFFFF
+        remaining = value if step == -1 else (1 << 32) - value
+
+        if self.timing is None:
+            iteration = 2
+        else:
+            iteration = (self.timing.instruction_cost(opcode) + self.timing.instruction_cost(''.join(branch[0:5])) +
+                         self.timing.wait_states(loop_address) + self.timing.wait_states(branch_address))
+
+        # The step budget and next event cycle are infinite when unbounded
+        limits = [remaining - 1]
+        if self.step_budget != float('inf'):
+            limits.append(int(self.step_budget) // 2)
+        if self.next_event_cycle != float('inf'):
+            limits.append((int(self.next_event_cycle) - self.cycle - 1) // iteration)
+        skipped = min(limits)
+        if skipped <= 0:
+            return
+
+        # The flags are those set by the last skipped iteration
+        previous = Binary32((value + (skipped - 1) * step) & 0xFFFFFFFF)
+        result = self._alu_operations[opcode](previous, immediate, self._get_carry())
+        self.registers[register] = result
+        self.set_status_flags(result.get_flags())
+
+        self.cycle += skipped * iteration
+        self.step_budget -= 2 * skipped
+
     def set_status_flags(self, flags):
-        self.registers['SR'][28:] = flags
+        carry, overflow, negative, zero = flags
+        self.registers['SR'] = Binary32.from_digits(self.registers['SR'][:28] + (zero, overflow, carry, negative))
 
     def get_status_flags(self):
         return list(reversed(self.registers['SR'][28:]))
@@ -126,6 +239,23 @@ class FRISCSimulator(Simulator):
         self.registers['R7'] += 4
         return word
 
+    def enable_heatmap(self, heatmap=None):
+        """Count memory accesses as Simulator.enable_heatmap does, and also track
+        the maximum stack depth, which only pushes can increase"""
+        heatmap = super().enable_heatmap(heatmap)
+        self.push_on_stack = self._push_on_stack_profiled
+        return heatmap
+
+    def disable_heatmap(self):
+        if self.heatmap is not None:
+            del self.push_on_stack
+        super().disable_heatmap()
+
+    def _push_on_stack_profiled(self, word):
+        site = self._to_address(self.instruction_address) if self.instruction_address is not None else None
+        self.heatmap.record_push(self._to_address(self.registers['R7']), self.config['WORD_SIZE_BYTES'], site)
+        type(self).push_on_stack(self, word)
+
     # Auxilliary functions and data
 
     _alu_operations = {
@@ -140,10 +270,19 @@ class FRISCSimulator(Simulator):
         '01001': lambda x, y, c: x.rotr(y),
         '01010': lambda x, y, c: x << y,
         '01011': lambda x, y, c: x >> y,
-        '01100': lambda x, y, c: x.ashr(y),
+        '01100': lambda x, y, c: x.arshift(y),
         '01101': lambda x, y, c: x - y
     }
 
+    _branch_opcodes = ('11000', '11001', '11010', '11011', '11111')
+
+    _instruction_cycles = {                 # Fetch, execution and data transfer cycles, without wait states
+        '00000': 2, '00001': 2, '00010': 2, '00011': 2, '00100': 2, '00101': 2, '00110': 2,
+        '00111': 2, '01000': 2, '01001': 2, '01010': 2, '01011': 2, '01100': 2, '01101': 2,
+        '10000': 3, '10001': 3, '10010': 3, '10011': 3, '10100': 3, '10101': 3, '10110': 3, '10111': 3,
+        '11000': 2, '11001': 3, '11010': 2, '11011': 3, '11111': 2
+    }
+
     _conditions = {                         # ncvz
         '0000': lambda fs: match_binary_mask('xxxx', fs),
         '0010': lambda fs: match_binary_mask('0xxx', fs),
@@ -165,13 +304,15 @@ class FRISCSimulator(Simulator):
     def _register(self, reg_code):
         return 'R{}'.format(int(reg_code, 2))
 
+    def _set_status_bit(self, position, value):
+        status = self.registers['SR']
+        self.registers['SR'] = Binary32.from_digits(status[:position] + (value,) + status[position + 1:])
+
     def _get_carry(self):
         return self.registers['SR'][30]
 
     def _round_to_halfword(self, address):
-        address[-1] = '0'
-        return address
+        return address if address[-1] == '0' else Binary32.from_digits(address[:-1] + ('0',))
 
     def _round_to_word(self, address):
-        address[-1] = address[-2] = '0'
-        return address
+        return address if address[-2:] == ('0', '0') else Binary32.from_digits(address[:-2] + ('0', '0'))
@@ -0,0 +1,302 @@
+import numpy as np
+
+from simulators.frisc_simulator import FRISCSimulator
+
+
+class FRISCVectorSimulator:
+    """Runs a single FRISC program over many inputs at once, using NumPy
+
+    Every input is a lane: registers are arrays with one element per lane, and
+    memory is a two dimensional array with one row per lane. Each step, lanes
+    are grouped by the instruction word they are about to execute, so lanes
+    diverging on conditional branches are simply regrouped. Instructions are
+    decoded once per group and executed lane-wise.
+
+    Results match running FRISCSimulator separately for every input, with
+    condition codes evaluated through the same _conditions table. A lane which
+    would raise an error in FRISCSimulator is marked as FAULTED and stops.
+    IO devices and interrupts are not supported."""
+
+    RUNNING, HALTED, FAULTED = 0, 1, 2
+
+    REGISTERS = ['PC', 'SR', 'R0', 'R1', 'R2', 'R3', 'R4', 'R5', 'R6', 'R7']
+
+    def __init__(self, memory_size, lanes):
+        self.memory_size = memory_size
+        self.lanes = lanes
+        self.memory = np.zeros((lanes, memory_size), dtype=np.uint8)
+        self.registers = {name: np.zeros(lanes, dtype=np.int64) for name in self.REGISTERS}
+        self.iif = np.ones(lanes, dtype=bool)
+        self.status = np.full(lanes, self.RUNNING, dtype=np.int8)
+        self.steps = np.zeros(lanes, dtype=np.int64)
+        self._decoded = {}
+
+    # State procedures
+
+    def load(self, p_file_name):
+        """Load the same program into every lane"""
+        with open(p_file_name, 'r') as p_file:
+            self.load_listing(p_file)
+
+    def load_listing(self, listing):
+        """Load the same program into every lane from the lines of a .p file, such as the listing of an AssemblyResult"""
+        simulator = FRISCSimulator(self.memory_size)
+        simulator.load_listing(listing)
+        self.memory[:] = np.frombuffer(bytes(int(byte) & 0xFF for byte in simulator.memory), dtype=np.uint8)
+
+    def set_register(self, name, values):
+        """Set a register in every lane, either to one value or to one value per lane"""
+        self.registers[name][:] = np.asarray(values, dtype=np.int64) & _MASK
+
+    def set_memory(self, address, values, lane=None):
+        """Place bytes into memory at a given address, in a single lane or in all of them"""
+        data = np.asarray(values, dtype=np.uint8)
+        if lane is None:
+            self.memory[:, address: address + len(data)] = data
+        else:
+            self.memory[lane, address: address + len(data)] = data
+
+    # Execution procedures
+
+    def run(self, max_steps):
+        """Run every lane until it halts or faults, or until it executes max_steps instructions"""
+        for _ in range(max_steps):
+            if not self.run_step():
+                break
+
+    def run_step(self):
+        """Execute a single instruction in every running lane, return whether any lanes are running"""
+        active = np.flatnonzero(self.status == self.RUNNING)
+        if not len(active):
+            return False
+
+        self.steps[active] += 1
+        pcs = self.registers['PC'][active]
+        valid = pcs + 4 <= self.memory_size
+        self.status[active[~valid]] = self.FAULTED
+        active, pcs = active[valid], pcs[valid]
+
+        words = self._read(active, pcs, 4)
+        self.registers['PC'][active] = (pcs + 4) & _MASK
+
+        unique_words, groups = np.unique(words, return_inverse=True)
+        if len(unique_words) == 1:
+            self._execute(int(unique_words[0]), active)
+        else:
+            order = np.argsort(groups, kind='stable')
+            bounds = np.searchsorted(groups[order], np.arange(len(unique_words) + 1))
+            for i, word in enumerate(unique_words):
+                self._execute(int(word), active[order[bounds[i]: bounds[i + 1]]])
+        return True
+
+    def _execute(self, word, lanes):
+        decoded = self._decoded.get(word)
+        if decoded is None:
+            decoded = self._decoded[word] = _decode(word)
+        opcode, funct, destination, source1, source2, immediate, condition, return_type, move_flags = decoded
+        registers = self.registers
+
+        operand2 = registers[source2][lanes] if funct == 0 else np.full(len(lanes), immediate, dtype=np.int64)
+
+        if opcode == 0b00000:
+            if move_flags & 0b01:
+                operand2 = registers['SR'][lanes]
+            if move_flags & 0b10:
+                destination = 'SR'
+            registers[destination][lanes] = operand2
+
+        elif opcode < 0b10000:
+            operation = _ALU_OPERATIONS.get(opcode)
+            if operation is None:
+                self.status[lanes] = self.FAULTED
+                return
+            if opcode in _SHIFTS:
+                # Shifting by -2**31 never terminates in FRISCSimulator, as the amount cannot be negated
+                faulting = operand2 == 0x80000000
+                self.status[lanes[faulting]] = self.FAULTED
+                lanes, operand2 = lanes[~faulting], operand2[~faulting]
+
+            carry = (registers['SR'][lanes] >> 1) & 1
+            result, c, v, n, z = operation(registers[source1][lanes], operand2, carry)
+            if opcode != 0b01101:
+                registers[destination][lanes] = result
+            registers['SR'][lanes] = (registers['SR'][lanes] & ~0xF) | (z << 3) | (v << 2) | (c << 1) | n
+
+        elif opcode < 0b11000:
+            if funct == 0:
+                address = np.full(len(lanes), immediate, dtype=np.int64)
+            else:
+                address = (registers[source1][lanes] + immediate) & _MASK
+
+            if opcode == 0b10000:
+                lanes, value = self._load(lanes, registers['R7'][lanes], 4)
+                registers['R7'][lanes] = (registers['R7'][lanes] + 4) & _MASK
+                registers[destination][lanes] = value
+            elif opcode == 0b10001:
+                self._push(lanes, registers[destination][lanes])
+            elif opcode in _MEMORY_SIZES:
+                size = _MEMORY_SIZES[opcode]
+                address = address & ~(size - 1) & _MASK if size > 1 else address
+                if opcode & 1:
+                    self._store(lanes, address, registers[destination][lanes], size)
+                else:
+                    lanes, value = self._load(lanes, address, size)
+                    registers[destination][lanes] = value
+
+        else:
+            if condition is None:
+                self.status[lanes] = self.FAULTED
+                return
+            taken = condition[registers['SR'][lanes] & 0xF]
+            lanes, operand2 = lanes[taken], operand2[taken]
+
+            if opcode == 0b11000:
+                registers['PC'][lanes] = operand2
+            elif opcode == 0b11001:
+                lanes, operand2 = self._push(lanes, registers['PC'][lanes], operand2)
+                registers['PC'][lanes] = operand2
+            elif opcode == 0b11010:
+                registers['PC'][lanes] = (registers['PC'][lanes] + immediate) & _MASK
+            elif opcode == 0b11011:
+                lanes, value = self._load(lanes, registers['R7'][lanes], 4)
+                registers['R7'][lanes] = (registers['R7'][lanes] + 4) & _MASK
+                registers['PC'][lanes] = value
+                if return_type == 0b01:
+                    registers['SR'][lanes] |= 0x10
+                elif return_type == 0b11:
+                    self.iif[lanes] = True
+            elif opcode == 0b11111:
+                self.status[lanes] = self.HALTED
+
+    # Memory methods
+
+    def _read(self, lanes, addresses, size):
+        value = np.zeros(len(lanes), dtype=np.int64)
+        for i in range(size):
+            value |= self.memory[lanes, addresses + i].astype(np.int64) << (8 * i)
+        return value
+
+    def _load(self, lanes, addresses, size):
+        """Load values lane-wise, faulting lanes with invalid addresses, and
+        return the remaining lanes together with the loaded values"""
+        valid = addresses + size <= self.memory_size
+        self.status[lanes[~valid]] = self.FAULTED
+        return lanes[valid], self._read(lanes[valid], addresses[valid], size)
+
+    def _store(self, lanes, addresses, values, size):
+        valid = addresses + size <= self.memory_size
+        self.status[lanes[~valid]] = self.FAULTED
+        lanes, addresses, values = lanes[valid], addresses[valid], values[valid]
+        for i in range(size):
+            self.memory[lanes, addresses + i] = (values >> (8 * i)) & 0xFF
+        return lanes, valid
+
+    def _push(self, lanes, values, *extra):
+        registers = self.registers
+        registers['R7'][lanes] = (registers['R7'][lanes] - 4) & _MASK
+        lanes, valid = self._store(lanes, registers['R7'][lanes], values, 4)
+        return (lanes,) + tuple(e[valid] for e in extra) if extra else lanes
+
+
+# Auxilliary functions and data
+
+_MASK = 0xFFFFFFFF
+
+_SHIFTS = (0b01010, 0b01011, 0b01100)
+
+_MEMORY_SIZES = {0b10010: 1, 0b10011: 1, 0b10100: 2, 0b10101: 2, 0b10110: 4, 0b10111: 4}
+
+
+def _decode(word):
+    """Decode an instruction word the same way FRISCSimulator.execute_instruction does"""
+    opcode = word >> 27
+    funct = (word >> 26) & 1
+    immediate = word & 0xFFFFF
+    immediate = (immediate - (1 << 20)) & _MASK if immediate & 0x80000 else immediate
+
+    move_flags = 0
+    if opcode == 0 and (word >> 20) & 0b111:
+        move_flags = (0b10 if (word >> 21) & 1 else 0) | (0b01 if (word >> 20) & 1 else 0)
+
+    condition = FRISCSimulator._conditions.get('{:04b}'.format((word >> 22) & 0xF))
+    if condition is not None:
+        condition = np.array([condition([str((flags >> i) & 1) for i in range(4)]) for flags in range(16)])
+
+    return (opcode, funct, 'R{}'.format((word >> 23) & 7), 'R{}'.format((word >> 20) & 7), 'R{}'.format((word >> 17) & 7),
+            immediate, condition, word & 0b11, move_flags)
+
+
+def _signed(x):
+    return x - ((x >> 31) & 1) * (1 << 32)
+
+
+def _flags(result):
+    return (result >> 31) & 1, (result == 0).astype(np.int64)
+
+
+def _logic(result):
+    zeros = np.zeros_like(result)
+    return (result, zeros, zeros) + _flags(result)
+
+
+def _add(x, y, c):
+    total = x + y + c
+    result = total & _MASK
+    return (result, total >> 32, ((~(x ^ y) & (x ^ result)) >> 31) & 1) + _flags(result)
+
+
+def _sub(x, y, c):
+    difference = x - y - c
+    result = difference & _MASK
+    return (result, (difference < 0).astype(np.int64), (((x ^ y) & (x ^ result)) >> 31) & 1) + _flags(result)
+
+
+def _rotl(x, y):
+    k = y % 32
+    result = ((x << k) | (x >> (32 - k))) & _MASK
+    return result, result & 1, np.zeros_like(x), (x >> 31) & 1, (x == 0).astype(np.int64)
+
+
+def _rotr(x, y):
+    k = y % 32
+    result = ((x >> k) | (x << (32 - k))) & _MASK
+    return result, (result >> 31) & 1, np.zeros_like(x), (x >> 31) & 1, (x == 0).astype(np.int64)
+
+
+def _shift(x, k, left, arithmetic):
+    """Shift by non-negative amounts k, with the carry being the last bit shifted out"""
+    clipped = np.minimum(k, 32)
+    in_range = (k > 0) & (k <= 32)
+    if left:
+        result = np.where(k < 32, (x << clipped) & _MASK, 0)
+        carry = np.where(in_range, (x >> np.maximum(32 - clipped, 0)) & 1, 0)
+    else:
+        source = _signed(x) if arithmetic else x
+        result = (source >> np.minimum(k, 63)) & _MASK
+        carry = np.where(in_range, (x >> np.maximum(clipped - 1, 0)) & 1, 0)
+    return (result, carry, np.zeros_like(x)) + _flags(result)
+
+
+def _shift_signed(x, y, left, arithmetic):
+    """Shift by signed amounts, negative amounts shifting logically in the other direction"""
+    k = _signed(y)
+    forward = _shift(x, np.maximum(k, 0), left, arithmetic)
+    backward = _shift(x, np.maximum(-k, 0), not left, False)
+    return tuple(np.where(k >= 0, f, b) for f, b in zip(forward, backward))
+
+
+_ALU_OPERATIONS = {
+    0b00001: lambda x, y, c: _logic(x | y),
+    0b00010: lambda x, y, c: _logic(x & y),
+    0b00011: lambda x, y, c: _logic(x ^ y),
+    0b00100: lambda x, y, c: _add(x, y, 0),
+    0b00101: lambda x, y, c: _add(x, y, c),
+    0b00110: lambda x, y, c: _sub(x, y, 0),
+    0b00111: lambda x, y, c: _sub(x, y, c),
+    0b01000: lambda x, y, c: _rotl(x, y),
+    0b01001: lambda x, y, c: _rotr(x, y),
+    0b01010: lambda x, y, c: _shift_signed(x, y, True, False),
+    0b01011: lambda x, y, c: _shift_signed(x, y, False, False),
+    0b01100: lambda x, y, c: _shift_signed(x, y, False, True),
+    0b01101: lambda x, y, c: _sub(x, y, 0)
+}
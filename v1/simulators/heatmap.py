@@ -0,0 +1,107 @@
+import csv
+
+from array import array
+
+_MASK = 0xFFFFFFFF
+
+
+class MemoryHeatmap:
+    """Read and write counts of memory pages and cache lines, and the deepest the stack went
+
+    Counters are kept in arrays allocated once for the whole memory, so
+    recording an access costs two increments. An access is counted in the page
+    and the cache line of its first byte, and accesses outside of memory, such
+    as those of memory-mapped devices, are not counted.
+
+    Stack depth is measured from the stack pointer before the first push, and
+    for the maximum depth the addresses of the instructions which reached it
+    are kept, calls, pushes or the instruction an interrupt arrived after."""
+
+    GRANULARITIES = ('page', 'line')
+
+    def __init__(self, memory_size, page_offset_bits=8, line_offset_bits=4):
+        self.memory_size = memory_size
+        self.page_offset_bits = page_offset_bits
+        self.line_offset_bits = line_offset_bits
+        pages = (memory_size - 1 >> page_offset_bits) + 1
+        lines = (memory_size - 1 >> line_offset_bits) + 1
+        self.page_reads = array('Q', bytes(8 * pages))
+        self.page_writes = array('Q', bytes(8 * pages))
+        self.line_reads = array('Q', bytes(8 * lines))
+        self.line_writes = array('Q', bytes(8 * lines))
+        self.stack_base = None
+        self.max_stack_depth = 0
+        self.max_stack_sites = set()
+
+    def reset(self):
+        for counters in (self.page_reads, self.page_writes, self.line_reads, self.line_writes):
+            counters[:] = array('Q', bytes(8 * len(counters)))
+        self.stack_base = None
+        self.max_stack_depth = 0
+        self.max_stack_sites = set()
+
+    def record_read(self, address):
+        if address < self.memory_size:
+            self.page_reads[address >> self.page_offset_bits] += 1
+            self.line_reads[address >> self.line_offset_bits] += 1
+
+    def record_write(self, address):
+        if address < self.memory_size:
+            self.page_writes[address >> self.page_offset_bits] += 1
+            self.line_writes[address >> self.line_offset_bits] += 1
+
+    def record_push(self, stack_pointer, size, site):
+        """Record a push of size bytes by the instruction at site, with the stack pointer before it"""
+        if self.stack_base is None:
+            self.stack_base = stack_pointer
+        depth = (self.stack_base - stack_pointer + size) & _MASK
+        if depth > self.max_stack_depth:
+            self.max_stack_depth = depth
+            self.max_stack_sites = {site}
+        elif depth == self.max_stack_depth:
+            self.max_stack_sites.add(site)
+
+    # Reports
+
+    def counters(self, granularity='page'):
+        """Return the (reads, writes) arrays of pages or cache lines"""
+        if granularity == 'page':
+            return self.page_reads, self.page_writes
+        if granularity == 'line':
+            return self.line_reads, self.line_writes
+        raise ValueError('Unknown heatmap granularity {}, expected one of {}'.format(granularity, ', '.join(self.GRANULARITIES)))
+
+    def hottest(self, granularity='page', count=10):
+        """Return (start address, reads, writes) of the most accessed pages or cache lines"""
+        reads, writes = self.counters(granularity)
+        bits = self.page_offset_bits if granularity == 'page' else self.line_offset_bits
+        indices = sorted((i for i in range(len(reads)) if reads[i] or writes[i]), key=lambda i: -(reads[i] + writes[i]))
+        return [(i << bits, reads[i], writes[i]) for i in indices[:count]]
+
+    def to_dict(self):
+        return {
+            'reads': sum(self.page_reads),
+            'writes': sum(self.page_writes),
+            'max_stack_depth': self.max_stack_depth,
+            'max_stack_sites': sorted(self.max_stack_sites),
+            'hottest_pages': self.hottest('page'),
+            'hottest_lines': self.hottest('line')
+        }
+
+    def to_numpy(self, granularity='page'):
+        """Return an array of shape (pages or lines, 2) with the read and write counts, requires NumPy"""
+        import numpy as np
+
+        reads, writes = self.counters(granularity)
+        return np.stack((np.frombuffer(reads, dtype=np.uint64), np.frombuffer(writes, dtype=np.uint64)), axis=1)
+
+    def write_csv(self, file, granularity='page', skip_unused=False):
+        """Write start address, end address, reads and writes of every page or cache line to an open text file"""
+        reads, writes = self.counters(granularity)
+        size = 1 << (self.page_offset_bits if granularity == 'page' else self.line_offset_bits)
+        writer = csv.writer(file)
+        writer.writerow(['start', 'end', 'reads', 'writes'])
+        for i in range(len(reads)):
+            if reads[i] or writes[i] or not skip_unused:
+                writer.writerow(['{:08X}'.format(i * size), '{:08X}'.format(min((i + 1) * size, self.memory_size) - 1),
+                                 reads[i], writes[i]])
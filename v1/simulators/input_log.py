@@ -0,0 +1,96 @@
+import struct
+import sys
+import zlib
+
+from array import array
+
+INPUT_LOG_HEADER = struct.Struct('<4sII')
+INPUT_LOG_MAGIC = b'PEIL'
+
+
+class InputLog:
+    """Everything devices fed into a run, for replaying it deterministically
+
+    Entries are values read from devices, interrupts delivered to the
+    processor, memory written by devices outside of instructions, such as DMA
+    transfers, and the cycles those devices took, each with the cycle it
+    happened in. They are kept in flat typed arrays, in the order they
+    happened, and interrupt lines are stored as indices into lines. position
+    is the next entry to replay."""
+
+    READ, INTERRUPT, MEMORY, CYCLES = 0, 1, 2, 3
+
+    def __init__(self):
+        self.kinds = bytearray()
+        self.sizes = bytearray()
+        self.cycles = array('Q')
+        self.addresses = array('I')
+        self.values = array('I')
+        self.lines = []
+        self.position = 0
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, cycle, address, value=0, size=0):
+        self.kinds.append(kind)
+        self.sizes.append(size)
+        self.cycles.append(cycle)
+        self.addresses.append(address)
+        self.values.append(value)
+
+    def add_interrupt(self, cycle, line):
+        if line not in self.lines:
+            self.lines.append(line)
+        self.add(self.INTERRUPT, cycle, self.lines.index(line))
+
+    def entry(self, i):
+        """Return (kind, cycle, address, value, size) of an entry"""
+        return self.kinds[i], self.cycles[i], self.addresses[i], self.values[i], self.sizes[i]
+
+    # Serialization
+
+    def to_bytes(self):
+        """Serialize the entries into a header, the interrupt line names and a compressed block of the arrays"""
+        lines = '\n'.join(self.lines).encode()
+        block = bytes(self.kinds) + bytes(self.sizes)
+        for numbers in (self.cycles, self.addresses, self.values):
+            if sys.byteorder != 'little':
+                numbers = array(numbers.typecode, numbers)
+                numbers.byteswap()
+            block += numbers.tobytes()
+
+        block = zlib.compress(block)
+        return INPUT_LOG_HEADER.pack(INPUT_LOG_MAGIC, len(self), len(lines)) + lines + block
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, count, lines_length = INPUT_LOG_HEADER.unpack_from(data)
+        if magic != INPUT_LOG_MAGIC:
+            raise ValueError('Invalid input log, cannot load')
+
+        log = cls()
+        start = INPUT_LOG_HEADER.size
+        lines = bytes(data[start: start + lines_length]).decode()
+        log.lines = lines.split('\n') if lines else []
+        block = zlib.decompress(data[start + lines_length:])
+
+        log.kinds = bytearray(block[: count])
+        log.sizes = bytearray(block[count: 2 * count])
+        offset = 2 * count
+        for numbers in (log.cycles, log.addresses, log.values):
+            length = count * numbers.itemsize
+            numbers.frombytes(block[offset: offset + length])
+            if sys.byteorder != 'little':
+                numbers.byteswap()
+            offset += length
+        return log
+
+    def save(self, file_name):
+        with open(file_name, 'wb') as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, file_name):
+        with open(file_name, 'rb') as file:
+            return cls.from_bytes(file.read())
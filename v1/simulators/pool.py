@@ -0,0 +1,39 @@
+from contextlib import contextmanager
+
+
+class SimulatorPool:
+    """A pool of pre-initialised simulator instances
+
+    Simulators are created by calling factory, which should also attach any
+    devices they need. Released simulators are reset and reused, and since
+    resetting only clears the memory pages a run has written to, handing out a
+    simulator from the pool is much cheaper than constructing a new one."""
+
+    def __init__(self, factory, size=0):
+        self.factory = factory
+        self.free = [factory() for _ in range(size)]
+
+    def acquire(self):
+        return self.free.pop() if self.free else self.factory()
+
+    def release(self, simulator):
+        if simulator.undo_log is not None:
+            simulator.disable_reverse_execution()
+        simulator.disable_timing()
+        simulator.disable_coverage()
+        simulator.disable_heatmap()
+        simulator.disable_input_log()
+        simulator.breakpoints.clear()
+        simulator.clear_probes()
+        simulator.clear_watchpoints()
+        simulator.init()
+        self.free.append(simulator)
+
+    @contextmanager
+    def simulator(self):
+        """Acquire a simulator for the duration of a with block"""
+        simulator = self.acquire()
+        try:
+            yield simulator
+        finally:
+            self.release(simulator)
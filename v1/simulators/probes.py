@@ -0,0 +1,122 @@
+import ast
+
+from collections import namedtuple
+
+BreakpointHit = namedtuple('BreakpointHit', ['address', 'probe'])
+TraceEntry = namedtuple('TraceEntry', ['cycle', 'address', 'values'])
+
+_NODES = (ast.Expression, ast.Tuple, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare, ast.IfExp, ast.Name,
+          ast.Load, ast.Constant, ast.Subscript, ast.Call, ast.boolop, ast.operator, ast.unaryop, ast.cmpop)
+
+_MASK = 0xFFFFFFFF
+
+
+def compile_expression(source, names):
+    """Parse and compile an expression over registers and memory into a code object
+
+    Expressions are Python expressions restricted to integer constants,
+    arithmetic, comparisons, boolean operators, the given names, memory
+    accessors such as mem[SP] and the signed function. Raises ValueError for
+    anything else."""
+    try:
+        tree = ast.parse(source.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError('Invalid expression: {}'.format(e.msg))
+
+    for node in ast.walk(tree):
+        if not isinstance(node, _NODES):
+            raise ValueError('Invalid expression, {} not allowed'.format(node.__class__.__name__))
+        if isinstance(node, ast.Name) and node.id not in names and node.id not in ExpressionNamespace.functions:
+            raise ValueError('Invalid expression, unknown name {}'.format(node.id))
+        if isinstance(node, ast.Constant) and not isinstance(node.value, int):
+            raise ValueError('Invalid expression, only integer constants allowed')
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.keywords):
+            raise ValueError('Invalid expression, only calls of plain functions allowed')
+        if isinstance(node, ast.Subscript) and not (isinstance(node.value, ast.Name) and node.value.id in ExpressionNamespace.memory):
+            raise ValueError('Invalid expression, only memory can be indexed')
+
+    return compile(tree, '<{}>'.format(source.strip()), 'eval')
+
+
+class Probe:
+    """A conditional breakpoint, or a tracepoint logging expressions without stopping
+
+    The condition and the expressions are compiled when the probe is made,
+    and evaluated only when execution reaches its address."""
+
+    BREAKPOINT, TRACEPOINT = 'breakpoint', 'tracepoint'
+
+    def __init__(self, address, kind, names, condition=None, expressions=None):
+        self.address = address
+        self.kind = kind
+        self.condition = condition
+        self.expressions = expressions
+        self.condition_code = compile_expression(condition, names) if condition is not None else None
+        self.expressions_code = compile_expression('(' + expressions + ',)', names) if expressions is not None else None
+        self.hits = 0
+        self.error = None
+
+    def test(self, namespace):
+        """Return whether the condition holds, counting the hit if it does
+
+        A condition which cannot be evaluated, for example reading outside of
+        memory, holds, so that the error stops execution and can be seen."""
+        try:
+            result = self.condition_code is None or bool(eval(self.condition_code, {'__builtins__': {}}, namespace))
+        except Exception as e:
+            self.error = str(e) or e.__class__.__name__
+            result = True
+        self.hits += result
+        return result
+
+    def trace(self, namespace):
+        """Return the values of the expressions, or None if the condition does not hold"""
+        if not self.test(namespace):
+            return None
+        try:
+            return eval(self.expressions_code, {'__builtins__': {}}, namespace)
+        except Exception as e:
+            self.error = str(e) or e.__class__.__name__
+            return (self.error,)
+
+    def __repr__(self):
+        return 'Probe({:08X}, {}, {!r}, {!r})'.format(self.address, self.kind, self.condition, self.expressions)
+
+
+def _signed(value, bits):
+    return value - (1 << bits) if value & (1 << (bits - 1)) else value
+
+
+class ExpressionNamespace:
+    """Registers, memory and functions of probe expressions, read only when an expression uses them
+
+    Registers and memory read as unsigned integers, signed converts them."""
+
+    functions = {'signed': lambda value, bits=32: _signed(value & (1 << bits) - 1, bits)}
+
+    memory = {'mem': 4, 'half': 2, 'byte': 1}
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+
+    def __getitem__(self, name):
+        simulator = self.simulator
+        name = simulator.register_aliases.get(name, name)
+        if name in simulator.registers:
+            return int(simulator.registers[name]) & _MASK
+        if name in self.memory:
+            return _MemoryView(simulator, self.memory[name])
+        return self.functions[name]
+
+
+class _MemoryView:
+
+    def __init__(self, simulator, size):
+        self.simulator = simulator
+        self.size = size
+
+    def __getitem__(self, address):
+        address &= _MASK
+        if not 0 <= address <= len(self.simulator.memory) - self.size:
+            raise IndexError('Address {:08X} outside of memory'.format(address))
+        return int(self.simulator._read_memory(address, self.size)) & ((1 << (8 * self.size)) - 1)
@@ -1,6 +1,20 @@
+import heapq
+import io
+import pickle
+import struct
+import zlib
+
 from abc import ABCMeta, abstractmethod
+from collections import namedtuple
 from enum import Enum
+from simulators.coverage import Coverage
+from simulators.devices import DeviceBus, InterruptController
+from simulators.heatmap import MemoryHeatmap
+from simulators.input_log import InputLog
+from simulators.probes import BreakpointHit, ExpressionNamespace, Probe, TraceEntry
+from simulators.undo_log import UndoLog
 from utils.binary import *
+from utils.binary import _byte_values
 
 
 class SimulatorState(Enum):
@@ -12,6 +26,43 @@ class SimulatorState(Enum):
     TERMINATED = 5
 
 
+class WatchpointType(Enum):
+    READ = 1
+    WRITE = 2
+    ACCESS = 3
+
+
+Watchpoint = namedtuple('Watchpoint', ['start', 'end', 'type'])
+WatchpointHit = namedtuple('WatchpointHit', ['watchpoint', 'address', 'pc', 'old_value', 'new_value'])
+
+SNAPSHOT_HEADER = struct.Struct('<4sII')
+SNAPSHOT_MAGIC = b'PEAS'
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """Pickles references to the simulator and its attached devices by index,
+    so that a snapshot restores into the live objects"""
+
+    def __init__(self, file, simulator):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.references = {id(simulator): 'simulator'}
+        self.references.update((id(device), i) for i, device in enumerate(simulator.devices()))
+
+    def persistent_id(self, obj):
+        return self.references.get(id(obj))
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, simulator):
+        super().__init__(file)
+        self.simulator = simulator
+        self.devices = simulator.devices()
+
+    def persistent_load(self, pid):
+        return self.simulator if pid == 'simulator' else self.devices[pid]
+
+
 class Simulator(metaclass=ABCMeta):
     """Abstract base class for a processor simulator implementation
 
@@ -19,13 +70,21 @@ class Simulator(metaclass=ABCMeta):
     a memory array and a dictionary of named registers.
 
     Configuration object must contain all the properties listed below, modified
-    to fit the processor wich is being simulated"""
+    to fit the processor wich is being simulated. Every instance works on its
+    own copy of it, as well as on its own memory, registers and breakpoints.
+
+    Implementations should store the address of the instruction being executed
+    into instruction_address, so that watchpoint hits can report it, count
+    executed cycles in cycle and call process_events once cycle reaches
+    next_event_cycle.
+
+    Implementations may skip over instructions whose effects they can compute
+    directly, as long as the resulting state and cycle count are exactly the
+    same. They must only do so while fast_forward is set and reverse execution
+    is disabled, and skip at most step_budget instructions, decreasing it by
+    the number skipped. Only run sets a budget, single steps are never skipped."""
 
     state = SimulatorState.UNINITIALIZED
-    memory = []
-    annotations = []
-    breakpoints = set()
-    registers = {}
 
     config = {  # Default values, modify to model different processors
         'ENDIANNESS': 'little',
@@ -36,65 +95,214 @@ class Simulator(metaclass=ABCMeta):
         'ADDRESS_SIZE_BYTES': 4,
         'ADDRESS_SIZE_BITS': 32,
         'MEMORY_SIZE_BYTES': 65536,
-        'MEMORY_SIZE_WORDS': 65536 // 4
+        'MEMORY_SIZE_WORDS': 65536 // 4,
+        'PAGE_OFFSET_BITS': 8,
+        'CACHE_LINE_OFFSET_BITS': 4
     }
 
+    register_aliases = {}   # Other names of registers in probe expressions
+
+    instruction_address = None
+
+    def __init__(self):
+        self.config = dict(self.config)
+        self.memory = []
+        self.annotations = []
+        self.dirty_pages = set()
+        self.changed_pages = set()
+        self.breakpoints = set()
+        self.probes = {}
+        self.breakpoint_hit = None
+        self.trace_log = []
+        self.registers = {}
+        self.device_bus = DeviceBus()
+        self.interrupts = InterruptController()
+        self.watchpoints = []
+        self.trapped_pages = set()
+        self.watchpoint_hit = None
+        self.undo_log = None
+        self.timing = None
+        self.coverage = None
+        self.heatmap = None
+        self.input_log = None
+        self.replaying = False
+        self.fast_forward = True
+        self.step_budget = 0
+        self.reset_devices()
+
     # Processor state procedures
 
     @abstractmethod
     def init(self):
         pass
 
+    def clear_memory(self):
+        """Zero the memory and its annotations
+
+        Memory is only allocated on the first call or when its size changes,
+        afterwards only the pages written to since the last call are reset."""
+        size = self.config['MEMORY_SIZE_BYTES']
+        if len(self.memory) != size:
+            self.memory = [_byte_values[0]] * size
+            self.annotations = [''] * size
+            self.changed_pages = set(range((size - 1 >> self.config['PAGE_OFFSET_BITS']) + 1))
+        else:
+            self.changed_pages |= self.dirty_pages
+            page_size = 1 << self.config['PAGE_OFFSET_BITS']
+            zeros, blanks = [_byte_values[0]] * page_size, [''] * page_size
+            for page in self.dirty_pages:
+                start = page * page_size
+                end = min(start + page_size, size)
+                self.memory[start: end] = zeros[: end - start]
+                self.annotations[start: end] = blanks[: end - start]
+        self.dirty_pages = set()
+
+    def take_changed_pages(self):
+        """Return the memory pages changed since the last call, for views to redraw only those"""
+        changed, self.changed_pages = self.changed_pages, set()
+        return changed
+
     # TODO:: Standardize .p file format
     def load(self, p_file_name):
         if self.state != SimulatorState.INITIALIZED:
             raise RuntimeError('Cannot load a program, processor in invalid state')
 
         with open(p_file_name, "r") as p_file:
-            address_end_pos = 2 * self.config['ADDRESS_SIZE_BYTES']
-            annotation_start_pos = address_end_pos + 3 * self.config['WORD_SIZE_BYTES'] + 1
+            self.load_listing(p_file)
+
+    def load_listing(self, listing):
+        """Load a program from the lines of a .p file, such as the listing of an AssemblyResult"""
+        if self.state != SimulatorState.INITIALIZED:
+            raise RuntimeError('Cannot load a program, processor in invalid state')
 
-            lines = [(line[:annotation_start_pos], line[annotation_start_pos:])
-                     for line in p_file if line[:annotation_start_pos].rstrip()]
+        address_end_pos = 2 * self.config['ADDRESS_SIZE_BYTES']
+        annotation_start_pos = address_end_pos + 3 * self.config['WORD_SIZE_BYTES'] + 1
 
-            last_line_number = 0
-            for (code, annotation) in lines:
-                current_line_number = (int(code[:address_end_pos], 16) if code[:address_end_pos].strip() else last_line_number + self.config['WORD_SIZE_BYTES'])
+        lines = [(line[:annotation_start_pos], line[annotation_start_pos:])
+                 for line in listing if line[:annotation_start_pos].rstrip()]
 
-                self.annotations[current_line_number] = annotation
+        last_line_number = 0
+        for (code, annotation) in lines:
+            current_line_number = (int(code[:address_end_pos], 16) if code[:address_end_pos].strip() else last_line_number + self.config['WORD_SIZE_BYTES'])
 
-                if self.config['ENDIANNESS'] == 'little':
-                    for i in range(0, self.config['WORD_SIZE_BYTES']):
-                        self.memory[current_line_number + i] = Binary8.from_hex(code[address_end_pos + 2 + 3 * i: address_end_pos + 5 + 3 * i])
-                else:
-                    raise NotImplementedError('Big endian unsupported yet')
+            self.annotations[current_line_number] = annotation
+            self.dirty_pages.add(current_line_number >> self.config['PAGE_OFFSET_BITS'])
+            self.dirty_pages.add((current_line_number + self.config['WORD_SIZE_BYTES'] - 1) >> self.config['PAGE_OFFSET_BITS'])
 
-                last_line_number = current_line_number
+            if self.config['ENDIANNESS'] == 'little':
+                for i in range(0, self.config['WORD_SIZE_BYTES']):
+                    self.memory[current_line_number + i] = Binary8.from_hex(code[address_end_pos + 2 + 3 * i: address_end_pos + 5 + 3 * i])
+            else:
+                raise NotImplementedError('Big endian unsupported yet')
 
-            self.state = SimulatorState.LOADED
+            last_line_number = current_line_number
 
-    def run(self):
+        self.changed_pages |= self.dirty_pages
+        self.state = SimulatorState.LOADED
+
+    def run(self, max_steps=None):
+        """Run until the program halts or is paused, or until max_steps instructions
+        are executed, in which case the processor is left paused
+
+        Returns the number of cycles the run took, see enable_timing."""
         if self.state not in (SimulatorState.LOADED, SimulatorState.PAUSED):
             raise RuntimeError('Cannot run, processor in invalid state')
 
+        start_cycle = self.cycle
+        self.watchpoint_hit = None
         self.state = SimulatorState.RUNNING
-        while self.state == SimulatorState.RUNNING:
-            self.execute_single()
+        self.step_budget = max_steps if max_steps is not None else float('inf')
+
+        if self.breakpoints or self.probes:
+            self._run_checking_breakpoints()
+        else:
+            self.breakpoint_hit = None
+            while self.state == SimulatorState.RUNNING and self.step_budget > 0:
+                self.step_budget -= 1
+                self.execute_single()
+        self.step_budget = 0
+
+        if self.state == SimulatorState.RUNNING:
+            self.state = SimulatorState.PAUSED
+
+        self.device_bus.flush()
+        return self.cycle - start_cycle
 
     def run_step(self):
         if self.state not in (SimulatorState.LOADED, SimulatorState.PAUSED):
             raise RuntimeError('Cannot run a step, processor in invalid state')
 
+        start_cycle = self.cycle
+        self.watchpoint_hit = None
+        if self.probes:
+            self._check_probes(self._to_address(self.registers['PC']), False)
         self.execute_single()
+        self.device_bus.flush()
 
         if self.state != SimulatorState.TERMINATED:
             self.state = SimulatorState.PAUSED
+        return self.cycle - start_cycle
+
+    def _run_checking_breakpoints(self):
+        """Run like run, stopping before instructions at breakpoints whose conditions hold
+
+        Only the addresses of breakpoints and probes are looked up, their
+        conditions are evaluated just there. A run resumed from a breakpoint
+        executes the instruction it stopped at."""
+        resume_address = self.breakpoint_hit.address if self.breakpoint_hit is not None else None
+        self.breakpoint_hit = None
+        breakpoints, probes = self.breakpoints, self.probes
+
+        while self.state == SimulatorState.RUNNING and self.step_budget > 0:
+            address = self._to_address(self.registers['PC'])
+            if (address in breakpoints or address in probes) and self._check_probes(address, address != resume_address):
+                break
+            resume_address = None
+
+            self.step_budget -= 1
+            self.execute_single()
 
     def pause(self):
         self.state = SimulatorState.PAUSED
+        self.device_bus.flush()
 
     def stop(self):
         self.state = SimulatorState.TERMINATED
+        self.device_bus.flush()
+
+    def reset_devices(self):
+        """Reset the cycle counter, event queue, interrupt requests and all attached devices"""
+        self.cycle = 0
+        self.events = []
+        self.next_event_cycle = float('inf')
+        self.event_counter = 0
+        self.events_processed = 0
+        self.device_bus.reset()
+        self.interrupts.reset()
+
+    # Event procedures
+
+    def schedule(self, delay, callback, *args):
+        """Schedule a callback to be called with args after a given number of cycles
+
+        Returns an event handle which can be passed to cancel_event."""
+        self.event_counter += 1
+        event = [self.cycle + max(delay, 0), self.event_counter, callback, args]
+        heapq.heappush(self.events, event)
+        self.next_event_cycle = self.events[0][0]
+        return event
+
+    def cancel_event(self, event):
+        event[2] = None
+
+    def process_events(self):
+        """Call all the callbacks which are due, and find the next event cycle"""
+        self.events_processed += 1
+        while self.events and self.events[0][0] <= self.cycle:
+            _, _, callback, args = heapq.heappop(self.events)
+            if callback is not None:
+                callback(*args)
+        self.next_event_cycle = self.events[0][0] if self.events else float('inf')
 
     # Execution procedures
 
@@ -106,6 +314,14 @@ class Simulator(metaclass=ABCMeta):
     def execute_instruction(self, instruction):
         pass
 
+    def branch_taken(self, instruction):
+        """Return whether a conditional branch instruction is about to be taken, or None for other instructions"""
+        return None
+
+    def accept_interrupt(self):
+        """Accept a pending interrupt, if the processor currently allows it, and return its line, or None"""
+        return None
+
     # Processor memory functions
 
     def is_valid_address(self, address):
@@ -113,72 +329,685 @@ class Simulator(metaclass=ABCMeta):
 
         Modify if neccessary for a specific processor, say if addressing in words,
         not bytes, or if address space is different"""
-        return int(address) >= 0 and int(address) <= self.config['MEMORY_SIZE_BYTES']
+        return int(address) >= 0 and int(address) < self.config['MEMORY_SIZE_BYTES']
 
-    def get_word_from_memory(self, address):
-        """Return a word from memory at a given address"""
+    def fetch_word_from_memory(self, address):
+        """Return an instruction word from memory, without triggering watchpoints"""
+        address = self._to_address(address)
         if not self.is_valid_address(address):
-            raise ValueError('Invalid address provided, cannot load word from this memory location')
+            raise ValueError('Invalid address provided, cannot fetch instruction from this memory location')
 
-        if self.config['ENDIANNESS'] == 'little':
-            word = self.memory[address]
-            for i in range(1, self.config['WORD_SIZE_BYTES']):
-                word = self.memory[address + i] // word
-            return word
-        else:
-            raise NotImplementedError('Big endian not supported yet')
+        return self._read_memory(address, self.config['WORD_SIZE_BYTES'])
+
+    def get_word_from_memory(self, address):
+        """Return a word from memory at a given address"""
+        return self._load(address, self.config['WORD_SIZE_BYTES'], 'word')
 
     def get_halfword_from_memory(self, address):
         """Return a halfword from memory at a given address"""
-        if not self.is_valid_address(address):
-            raise ValueError('Invalid address provided, cannot load byte from this memory location')
-
-        if self.config['ENDIANNESS'] == 'little':
-            word = self.memory[address]
-            for i in range(1, self.config['HALFWORD_SIZE_BYTES']):
-                word = self.memory[address + i] // word
-            return word
-        else:
-            raise NotImplementedError('Big endian not supported yet')
+        return self._load(address, self.config['HALFWORD_SIZE_BYTES'], 'halfword')
 
     def get_byte_from_memory(self, address):
         """Return a byte from memory at a given address"""
-        if not self.is_valid_address(address):
-            raise ValueError('Invalid address provided, cannot load byte from this memory location')
-
-        return self.memory[address]
+        return self._load(address, 1, 'byte')
 
     def set_word_in_memory(self, address, word):
         """Place a word into memory at a given address"""
+        self._store(address, word, self.config['WORD_SIZE_BYTES'], 'word')
+
+    def set_halfword_in_memory(self, address, halfword):
+        """Place a halfword into memory at a given address"""
+        self._store(address, halfword, self.config['HALFWORD_SIZE_BYTES'], 'halfword')
+
+    def set_byte_in_memory(self, address, byte):
+        """Place a byte into memory at a given address"""
+        self._store(address, byte, 1, 'byte')
+
+    def _load(self, address, size, unit):
+        address = self._to_address(address)
+        if self.trapped_pages and self._is_trapped(address, size):
+            return self._trapped_load(address, size, unit)
+
+        if not self.is_valid_address(address):
+            raise ValueError('Invalid address provided, cannot load {} from this memory location'.format(unit))
+        return self._read_memory(address, size)
+
+    def _store(self, address, value, size, unit):
+        address = self._to_address(address)
+        if self.trapped_pages and self._is_trapped(address, size):
+            return self._trapped_store(address, value, size, unit)
+
+        if not self.is_valid_address(address):
+            raise ValueError('Invalid address provided, cannot store {} to this memory location'.format(unit))
+        self._write_memory(address, value, size)
+
+    def _trapped_load(self, address, size, unit):
+        if self.device_bus.find(address) is not None:
+            return BinaryNumber(self.read_device(address, size), 8 * size)
+
+        if not self.is_valid_address(address):
+            raise ValueError('Invalid address provided, cannot load {} from this memory location'.format(unit))
+
+        value = self._read_memory(address, size)
+        self._check_watchpoints(address, size, WatchpointType.READ, value, value)
+        return value
+
+    def _trapped_store(self, address, value, size, unit):
+        if self.device_bus.find(address) is not None:
+            self.write_device(address, int(''.join(value[0: 8 * size]), 2), size)
+            return
+
         if not self.is_valid_address(address):
-            raise ValueError('Invalid address provided, cannot store word to this memory location')
+            raise ValueError('Invalid address provided, cannot store {} to this memory location'.format(unit))
+
+        old_value = self._read_memory(address, size)
+        self._write_memory(address, value, size)
+        self._check_watchpoints(address, size, WatchpointType.WRITE, old_value, self._read_memory(address, size))
 
+    def _to_address(self, address):
+        """Convert an address to an unsigned integer, wrapping around the address space"""
+        return int(address) % (1 << self.config['ADDRESS_SIZE_BITS'])
+
+    def _read_memory(self, address, size):
         if self.config['ENDIANNESS'] == 'little':
-            for i in range(0, self.config['WORD_SIZE_BYTES']):
-                self.memory[address + self.config['WORD_SIZE_BYTES'] - i - 1] = Binary8.from_digits(word[8 * i: 8 * (i + 1)])
+            value = self.memory[address]
+            for i in range(1, size):
+                value = self.memory[address + i] // value
+            return value
         else:
             raise NotImplementedError('Big endian not supported yet')
 
-    def set_halfword_in_memory(self, address, halfword):
-        """Place a halfword into memory at a given address"""
-        if not self.is_valid_address(address):
-            raise ValueError('Invalid address provided, cannot store halfword to this memory location')
-
+    def _write_memory(self, address, value, size):
+        first, last = address >> self.config['PAGE_OFFSET_BITS'], (address + size - 1) >> self.config['PAGE_OFFSET_BITS']
+        self.dirty_pages.add(first)
+        self.dirty_pages.add(last)
+        self.changed_pages.add(first)
+        self.changed_pages.add(last)
         if self.config['ENDIANNESS'] == 'little':
-            for i in range(0, self.config['HALFWORD_SIZE_BYTES']):
-                self.memory[address + self.config['HALFWORD_SIZE_BYTES'] - i - 1] = Binary8.from_digits(halfword[8 * i: 8 * (i + 1)])
+            for i in range(0, size):
+                self.memory[address + size - i - 1] = Binary8.from_digits(value[8 * i: 8 * (i + 1)])
         else:
             raise NotImplementedError('Big endian not supported yet')
 
-    def set_byte_in_memory(self, address, byte):
-        """Place a byte into memory at a given address"""
-        if not self.is_valid_address(address):
-            raise ValueError('Invalid address provided, cannot store byte from to memory location.')
+    # Processor IO devices functions
+
+    def attach_device(self, device, start, end=None):
+        """Map a device into the address space over an inclusive address range
+
+        Loads and stores falling into the range are dispatched to the device
+        instead of memory, stores are delivered to it in batches."""
+        start = self._to_address(start)
+        end = self._to_address(end) if end is not None else start
+        self.device_bus.attach(device, start, end)
+        device.connect(self)
+        self._update_trapped_pages()
+
+    def detach_device(self, device):
+        self.device_bus.detach(device)
+        self._update_trapped_pages()
+
+    def devices(self):
+        return [device for _, _, device in self.device_bus.ranges]
+
+    def read_device(self, address, size):
+        return self.device_bus.read(address, size)
+
+    def write_device(self, address, value, size):
+        self.device_bus.write(address, value, size)
+
+    # Processor input recording and replay functions
+
+    def enable_input_recording(self, log=None):
+        """Record device reads, interrupt deliveries and memory written by devices, and return the InputLog
+
+        Should be called once a program is loaded and devices are attached,
+        the recording versions of the device access methods are only installed
+        while recording."""
+        if self.undo_log is not None or self.input_log is not None:
+            raise RuntimeError('Cannot record input, reverse execution or another input log is enabled')
+
+        self.input_log = log if log is not None else InputLog()
+        self.read_device = self._read_device_recording
+        self.accept_interrupt = self._accept_interrupt_recording
+        self.process_events = self._process_events_recording
+        return self.input_log
+
+    def enable_input_replay(self, log):
+        """Feed a recorded InputLog back instead of emulating devices
+
+        Must start from the state recording started from, with the same
+        devices attached, so that their addresses stay mapped, but devices are
+        never called: reads return the recorded values, writes are dropped,
+        and recorded interrupts and memory writes are delivered through the
+        event queue at their cycles. Events and interrupt requests pending
+        when replay starts are dropped. Raises ValueError as soon as execution
+        diverges from the log."""
+        if self.undo_log is not None or self.input_log is not None:
+            raise RuntimeError('Cannot replay input, reverse execution or another input log is enabled')
+
+        self.input_log = log
+        self.replaying = True
+        log.position = 0
+        self.events = []
+        self.next_event_cycle = float('inf')
+        self.interrupts.reset()
+        self.read_device = self._read_device_replaying
+        self.write_device = self._write_device_replaying
+        self.accept_interrupt = self._accept_interrupt_replaying
+        self._schedule_replay()
+
+    def disable_input_log(self):
+        if self.input_log is None:
+            return
+
+        if self.replaying:
+            del self.write_device
+            self.events = [event for event in self.events if event[2] not in (self._replay_devices, self._replay_interrupt)]
+            heapq.heapify(self.events)
+            self.next_event_cycle = self.events[0][0] if self.events else float('inf')
+            self.interrupts.reset()
+        else:
+            del self.process_events
+        del self.read_device
+        del self.accept_interrupt
+        self.input_log = None
+        self.replaying = False
+
+    def _read_device_recording(self, address, size):
+        value = type(self).read_device(self, address, size)
+        self.input_log.add(InputLog.READ, self.cycle, address, value & 0xFFFFFFFF, size)
+        return value
+
+    def _accept_interrupt_recording(self):
+        cycle = self.cycle
+        line = type(self).accept_interrupt(self)
+        if line is not None:
+            self.input_log.add_interrupt(cycle, line)
+        return line
+
+    def _process_events_recording(self):
+        # Event callbacks are devices at work: the memory they write is recorded, their own device
+        # reads are not, and the cycles their memory accesses took are recorded as a whole
+        log, cycle, start = self.input_log, self.cycle, len(self.input_log)
+        del self.read_device
+        self._write_memory = self._write_memory_from_device
+        try:
+            type(self).process_events(self)
+        finally:
+            del self._write_memory
+            self.read_device = self._read_device_recording
+
+        for i in range(start, len(log)):
+            log.cycles[i] = cycle
+        if self.cycle != cycle:
+            log.add(InputLog.CYCLES, cycle, 0, self.cycle - cycle)
+
+    def _write_memory_from_device(self, address, value, size):
+        self.input_log.add(InputLog.MEMORY, self.cycle, address, int(''.join(value[0: 8 * size]), 2), size)
+        type(self)._write_memory(self, address, value, size)
+
+    def _read_device_replaying(self, address, size):
+        log = self.input_log
+        position = log.position
+        if (position >= len(log) or log.kinds[position] != InputLog.READ or log.addresses[position] != address or
+                log.cycles[position] != self.cycle):
+            raise ValueError('Replay diverged, unexpected read of device at {:08X} in cycle {}'.format(address, self.cycle))
+
+        log.position += 1
+        self._schedule_replay()
+        return log.values[position] & ((1 << 8 * size) - 1)
+
+    def _write_device_replaying(self, address, value, size):
+        pass
+
+    def _accept_interrupt_replaying(self):
+        log = self.input_log
+        position = log.position
+        if position >= len(log) or log.kinds[position] != InputLog.INTERRUPT or log.cycles[position] != self.cycle:
+            raise ValueError('Replay diverged, no interrupt recorded in cycle {}'.format(self.cycle))
+
+        line = log.lines[log.addresses[position]]
+        self.interrupts.requests = {line: [log]}
+        accepted = type(self).accept_interrupt(self)
+        self.interrupts.reset()
+        if accepted != line:
+            raise ValueError('Replay diverged, {} interrupt not accepted in cycle {}'.format(line, self.cycle))
+
+        log.position += 1
+        self._schedule_replay()
+        return accepted
+
+    def _schedule_replay(self):
+        """Schedule the delivery of the next entry, unless it is a read, which is delivered when it happens"""
+        log = self.input_log
+        if log.position >= len(log):
+            return
+
+        kind, cycle = log.kinds[log.position], log.cycles[log.position]
+        if kind in (InputLog.MEMORY, InputLog.CYCLES):
+            self.schedule(cycle - self.cycle, self._replay_devices)
+        elif kind == InputLog.INTERRUPT:
+            # Interrupts are accepted after the cycle counter is advanced for the instruction
+            self.schedule(cycle - 1 - self.cycle, self._replay_interrupt)
+
+    def _replay_devices(self):
+        log = self.input_log
+        cycle = self.cycle
+        while (log.position < len(log) and log.kinds[log.position] in (InputLog.MEMORY, InputLog.CYCLES) and
+               log.cycles[log.position] <= cycle):
+            kind, _, address, value, size = log.entry(log.position)
+            if kind == InputLog.MEMORY:
+                self._write_memory(address, BinaryNumber(value, 8 * size), size)
+            else:
+                self.cycle += value
+            log.position += 1
+        self._schedule_replay()
+
+    def _replay_interrupt(self):
+        self.interrupts.pending = True
+
+    # Processor timing functions
+
+    def enable_timing(self, timing):
+        """Count clock cycles with a timing model, instead of a cycle per instruction
+
+        Memory accesses are routed through counting versions of the access
+        methods only while a model is enabled, so without one they cost
+        nothing. Device delays are counted in the same cycles."""
+        self.timing = timing
+        self.fetch_word_from_memory = self._fetch_word_from_memory_timed
+        self._load = self._load_timed
+        self._store = self._store_timed
+
+    def disable_timing(self):
+        if self.timing is not None:
+            self.timing = None
+            del self.fetch_word_from_memory
+            del self._load
+            del self._store
+
+    def _fetch_word_from_memory_timed(self, address):
+        self.cycle += self.timing.wait_states(self._to_address(address))
+        return type(self).fetch_word_from_memory(self, address)
+
+    def _load_timed(self, address, size, unit):
+        self.cycle += self.timing.wait_states(self._to_address(address))
+        return type(self)._load(self, address, size, unit)
+
+    def _store_timed(self, address, value, size, unit):
+        self.cycle += self.timing.wait_states(self._to_address(address))
+        type(self)._store(self, address, value, size, unit)
+
+    # Processor coverage functions
+
+    def enable_coverage(self, coverage=None):
+        """Record executed instruction addresses and conditional branch directions, and return the Coverage
+
+        Instructions are routed through a recording version of
+        execute_instruction only while coverage is enabled."""
+        self.coverage = coverage if coverage is not None else Coverage(len(self.memory))
+        self.execute_instruction = self._execute_instruction_covered
+        return self.coverage
+
+    def disable_coverage(self):
+        if self.coverage is not None:
+            self.coverage = None
+            del self.execute_instruction
+
+    def _execute_instruction_covered(self, instruction):
+        address = self._to_address(self.instruction_address)
+        coverage = self.coverage
+        coverage.bitmap[address >> 5] |= 1 << ((address >> 2) & 7)
+
+        taken = self.branch_taken(instruction)
+        if taken is not None:
+            coverage.branches[address] = coverage.branches.get(address, 0) | (Coverage.TAKEN if taken else Coverage.NOT_TAKEN)
+        type(self).execute_instruction(self, instruction)
+
+    # Processor memory access profiling functions
+
+    def enable_heatmap(self, heatmap=None):
+        """Count reads and writes per memory page and cache line, and return the MemoryHeatmap
+
+        The load and store methods are routed through counting versions only
+        while a heatmap is enabled. Instruction fetches are not counted."""
+        self.heatmap = heatmap if heatmap is not None else MemoryHeatmap(
+            len(self.memory), self.config['PAGE_OFFSET_BITS'], self.config['CACHE_LINE_OFFSET_BITS'])
+        self.get_word_from_memory = self._get_word_from_memory_profiled
+        self.get_halfword_from_memory = self._get_halfword_from_memory_profiled
+        self.get_byte_from_memory = self._get_byte_from_memory_profiled
+        self.set_word_in_memory = self._set_word_in_memory_profiled
+        self.set_halfword_in_memory = self._set_halfword_in_memory_profiled
+        self.set_byte_in_memory = self._set_byte_in_memory_profiled
+        return self.heatmap
+
+    def disable_heatmap(self):
+        if self.heatmap is not None:
+            self.heatmap = None
+            del self.get_word_from_memory
+            del self.get_halfword_from_memory
+            del self.get_byte_from_memory
+            del self.set_word_in_memory
+            del self.set_halfword_in_memory
+            del self.set_byte_in_memory
+
+    def _get_word_from_memory_profiled(self, address):
+        self.heatmap.record_read(self._to_address(address))
+        return type(self).get_word_from_memory(self, address)
+
+    def _get_halfword_from_memory_profiled(self, address):
+        self.heatmap.record_read(self._to_address(address))
+        return type(self).get_halfword_from_memory(self, address)
+
+    def _get_byte_from_memory_profiled(self, address):
+        self.heatmap.record_read(self._to_address(address))
+        return type(self).get_byte_from_memory(self, address)
+
+    def _set_word_in_memory_profiled(self, address, word):
+        self.heatmap.record_write(self._to_address(address))
+        type(self).set_word_in_memory(self, address, word)
+
+    def _set_halfword_in_memory_profiled(self, address, halfword):
+        self.heatmap.record_write(self._to_address(address))
+        type(self).set_halfword_in_memory(self, address, halfword)
+
+    def _set_byte_in_memory_profiled(self, address, byte):
+        self.heatmap.record_write(self._to_address(address))
+        type(self).set_byte_in_memory(self, address, byte)
+
+    # Processor watchpoints functions
+
+    def add_watchpoint(self, start, end=None, watch_type=WatchpointType.WRITE):
+        """Add a watchpoint over an inclusive address range, and return it
+
+        Only memory pages containing a watchpoint are trapped, accesses to all
+        other pages skip the watchpoint checks entirely."""
+        start = int(start)
+        end = int(end) if end is not None else start
+        if end < start or not self.is_valid_address(start) or not self.is_valid_address(end):
+            raise ValueError('Invalid address range for a watchpoint')
+
+        watchpoint = Watchpoint(start, end, watch_type)
+        self.watchpoints.append(watchpoint)
+        self._update_trapped_pages()
+        return watchpoint
+
+    def remove_watchpoint(self, watchpoint):
+        self.watchpoints.remove(watchpoint)
+        self._update_trapped_pages()
+
+    def clear_watchpoints(self):
+        self.watchpoints = []
+        self._update_trapped_pages()
+
+    def _update_trapped_pages(self):
+        offset_bits = self.config['PAGE_OFFSET_BITS']
+        self.trapped_pages = {page for watchpoint in self.watchpoints
+                              for page in range(watchpoint.start >> offset_bits, (watchpoint.end >> offset_bits) + 1)}
+        self.trapped_pages |= self.device_bus.pages(offset_bits)
+
+    def _is_trapped(self, address, size):
+        offset_bits = self.config['PAGE_OFFSET_BITS']
+        return (address >> offset_bits in self.trapped_pages or
+                (address + size - 1) >> offset_bits in self.trapped_pages)
+
+    def _check_watchpoints(self, address, size, access, old_value, new_value):
+        end = address + size - 1
+        for watchpoint in self.watchpoints:
+            if watchpoint.start <= end and address <= watchpoint.end and watchpoint.type.value & access.value:
+                self.watchpoint_hit = WatchpointHit(watchpoint, address, self.instruction_address, old_value, new_value)
+                if self.state == SimulatorState.RUNNING:
+                    self.state = SimulatorState.PAUSED
+                return
+
+    # Processor snapshot functions
+
+    def save_snapshot(self):
+        """Serialize the full machine state into a compact binary snapshot
+
+        Memory is stored as a compressed block of bytes, registers, flags,
+        breakpoints, watchpoints, the event queue and the state of attached
+        devices follow in a pickled block. Annotations are not included."""
+        self.device_bus.flush()
+        memory = zlib.compress(bytes(int(byte) & 0xFF for byte in self.memory))
+
+        stream = io.BytesIO()
+        _SnapshotPickler(stream, self).dump({
+            'state': self.state,
+            'registers': self.registers,
+            'flags': getattr(self, 'flags', {}),
+            'breakpoints': self.breakpoints,
+            'watchpoints': self.watchpoints,
+            'instruction_address': self.instruction_address,
+            'cycle': self.cycle,
+            'events': self.events,
+            'event_counter': self.event_counter,
+            'interrupts': self.interrupts.requests,
+            'devices': [{name: value for name, value in vars(device).items() if name != 'simulator'}
+                        for device in self.devices()]
+        })
+
+        return SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(self.memory), len(memory)) + memory + stream.getvalue()
+
+    def restore_snapshot(self, snapshot):
+        """Restore the machine state from a snapshot made by save_snapshot
+
+        The simulator must have the same memory size and the same devices
+        attached as the one the snapshot was taken from."""
+        magic, memory_size, memory_length = SNAPSHOT_HEADER.unpack_from(snapshot)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError('Invalid snapshot, cannot restore')
+        if memory_size != self.config['MEMORY_SIZE_BYTES']:
+            raise ValueError('Snapshot memory size does not match, cannot restore')
+
+        start = SNAPSHOT_HEADER.size
+        memory = zlib.decompress(snapshot[start: start + memory_length])
+        saved = _SnapshotUnpickler(io.BytesIO(snapshot[start + memory_length:]), self).load()
+        if len(saved['devices']) != len(self.devices()):
+            raise ValueError('Snapshot devices do not match, cannot restore')
+
+        self.memory = list(map(_byte_values.__getitem__, memory))
+        page_size = 1 << self.config['PAGE_OFFSET_BITS']
+        zeros = bytes(page_size)
+        self.changed_pages |= self.dirty_pages
+        self.dirty_pages = {page for page in range((len(memory) + page_size - 1) // page_size)
+                            if memory[page * page_size: (page + 1) * page_size] != zeros[: len(memory) - page * page_size]}
+        self.changed_pages |= self.dirty_pages
+        self.registers = saved['registers']
+        self.flags = saved['flags']
+        self.breakpoints = saved['breakpoints']
+        self.watchpoints = saved['watchpoints']
+        self.instruction_address = saved['instruction_address']
+        self.cycle = saved['cycle']
+        self.events = saved['events']
+        self.event_counter = saved['event_counter']
+        self.next_event_cycle = self.events[0][0] if self.events else float('inf')
+        self.interrupts.requests = saved['interrupts']
+        self.interrupts.pending = any(self.interrupts.requests.values())
+        for device, state in zip(self.devices(), saved['devices']):
+            vars(device).update(state)
+
+        self.device_bus.pending = {}
+        self.watchpoint_hit = None
+        self._update_trapped_pages()
+        self.state = saved['state']
+
+    # Reverse execution functions
+
+    def enable_reverse_execution(self, checkpoint_interval=10000):
+        """Start recording an undo log, allowing execution to be stepped backwards
+
+        Should be called once a program is loaded. While disabled, the recording
+        hooks are not installed at all, so there is no overhead. Cannot be
+        combined with recording or replaying input."""
+        if self.input_log is not None:
+            raise RuntimeError('Cannot enable reverse execution while recording or replaying input')
+        self.undo_log = UndoLog(sorted(self.registers), sorted(getattr(self, 'flags', {})), checkpoint_interval)
+        self.undo_log.add_checkpoint(self.save_snapshot())
+        self.execute_single = self._execute_single_recording
+        self._write_memory = self._write_memory_recording
+
+    def disable_reverse_execution(self):
+        if self.undo_log is None:
+            return
+
+        self.undo_log = None
+        del self.execute_single
+        del self._write_memory
+
+    def step_back(self):
+        """Undo the last executed instruction"""
+        if self.undo_log is None:
+            raise RuntimeError('Cannot step back, reverse execution is not enabled')
+        if self.undo_log.position == 0:
+            raise RuntimeError('Cannot step back, already at the start of recorded execution')
+
+        self.device_bus.flush()
+        self._undo_single()
+        self.state = SimulatorState.PAUSED
 
-        self.memory[address] = byte
+    def run_back_to_breakpoint(self):
+        """Step backwards until an instruction with a breakpoint is reached, or
+        until the start of recorded execution"""
+        self.step_back()
+        while self.undo_log.position > 0 and not self.is_breakpoint_at(self._to_address(self.registers['PC'])):
+            self._undo_single()
+
+    def reverse_continue(self):
+        """Step backwards until a breakpoint is reached, or until an instruction
+        which wrote to memory covered by a write watchpoint is undone"""
+        self.watchpoint_hit = None
+        self.step_back()
+        while (self.undo_log.position > 0 and self.watchpoint_hit is None and
+               not self.is_breakpoint_at(self._to_address(self.registers['PC']))):
+            self._undo_single()
+
+    def seek(self, position):
+        """Return to the state before the instruction with a given index in the
+        undo log, by restoring the closest checkpoint and replaying from it"""
+        log = self.undo_log
+        if position < 0 or position > log.position:
+            raise ValueError('Cannot seek, position outside of recorded execution')
+
+        checkpoint_position, snapshot = log.checkpoint_before(position)
+        breakpoints, watchpoints, watchpoint_hit = self.breakpoints, self.watchpoints, self.watchpoint_hit
+        self.restore_snapshot(snapshot)
+        self.clear_watchpoints()
+
+        log.truncate(checkpoint_position)
+        while log.position < position:
+            self.execute_single()
+        self.device_bus.flush()
+
+        self.breakpoints, self.watchpoints, self.watchpoint_hit = breakpoints, watchpoints, watchpoint_hit
+        self._update_trapped_pages()
+        self.state = SimulatorState.PAUSED
+
+    def _undo_single(self):
+        log = self.undo_log
+        external = log.is_external()
+        self.cycle, address, deltas = log.pop()
+
+        if external:
+            self.seek(log.position)
+        else:
+            self.instruction_address = Binary32(address) if address >= 0 else None
+            for kind, key, value in deltas:
+                if kind == UndoLog.REGISTER:
+                    self.registers[log.register_names[key]] = Binary32(value)
+                elif kind == UndoLog.FLAG:
+                    self.flags[log.flag_names[key]] = bool(value)
+                else:
+                    self.memory[key] = _byte_values[value]
+                    self.changed_pages.add(key >> self.config['PAGE_OFFSET_BITS'])
+
+        if self.trapped_pages:
+            for kind, key, value in deltas:
+                if kind == UndoLog.MEMORY and self._is_trapped(key, 1):
+                    self._check_watchpoints(key, 1, WatchpointType.WRITE, _byte_values[value], None)
+
+    def _execute_single_recording(self):
+        log = self.undo_log
+        registers = [self.registers[name] for name in log.register_names]     # Immutable, so no copies are needed
+        flags = [self.flags[name] for name in log.flag_names]
+        activity = (self.device_bus.accesses, self.events_processed, self.interrupts.pending)
+
+        log.begin(self.cycle, self._to_address(self.instruction_address) if self.instruction_address is not None else -1)
+        type(self).execute_single(self)
+
+        for i, name in enumerate(log.register_names):
+            value = self.registers[name]
+            if value is not registers[i] and value.digits != registers[i].digits:
+                log.add(UndoLog.REGISTER, i, int(str(registers[i]), 2))
+        for i, name in enumerate(log.flag_names):
+            if self.flags[name] != flags[i]:
+                log.add(UndoLog.FLAG, i, int(flags[i]))
+        if activity != (self.device_bus.accesses, self.events_processed, False):
+            log.mark_external()
+
+        if log.needs_checkpoint():
+            log.add_checkpoint(self.save_snapshot())
+
+    def _write_memory_recording(self, address, value, size):
+        for i in range(size):
+            self.undo_log.add(UndoLog.MEMORY, address + i, int(self.memory[address + i]) & 0xFF)
+        type(self)._write_memory(self, address, value, size)
 
     # Processor breakpoints functions
 
+    def add_conditional_breakpoint(self, address, condition):
+        """Stop before the instruction at an address whenever a condition holds, and return the Probe
+
+        Conditions are Python expressions over registers, register aliases and
+        memory, for example R3 == 0x10 and mem[SP] != 0, see compile_expression.
+        Probes are not part of snapshots."""
+        return self._add_probe(Probe(address, Probe.BREAKPOINT, self._expression_names(), condition=condition))
+
+    def add_tracepoint(self, address, expressions, condition=None):
+        """Log comma separated expressions to trace_log whenever the instruction at an
+        address is reached, and an optional condition holds, and return the Probe"""
+        return self._add_probe(Probe(address, Probe.TRACEPOINT, self._expression_names(), condition, expressions))
+
+    def remove_probe(self, probe):
+        probes = self.probes[probe.address]
+        probes.remove(probe)
+        if not probes:
+            del self.probes[probe.address]
+
+    def clear_probes(self):
+        self.probes = {}
+        self.trace_log = []
+
+    def _add_probe(self, probe):
+        if not self.is_valid_address(probe.address):
+            raise ValueError('Invalid address for a probe')
+        self.probes.setdefault(probe.address, []).append(probe)
+        return probe
+
+    def _expression_names(self):
+        return set(self.registers) | set(self.register_aliases) | set(ExpressionNamespace.memory)
+
+    def _check_probes(self, address, stop=True):
+        """Evaluate the breakpoints and probes at an address, logging tracepoints, and
+        return whether execution stops there, setting breakpoint_hit"""
+        hit = BreakpointHit(address, None) if stop and address in self.breakpoints else None
+
+        probes = self.probes.get(address)
+        if probes:
+            namespace = ExpressionNamespace(self)
+            for probe in probes:
+                if probe.kind == Probe.TRACEPOINT:
+                    values = probe.trace(namespace)
+                    if values is not None:
+                        self.trace_log.append(TraceEntry(self.cycle, address, values))
+                elif stop and hit is None and probe.test(namespace):
+                    hit = BreakpointHit(address, probe)
+
+        if hit is not None:
+            self.breakpoint_hit = hit
+            return True
+        return False
+
     def toggle_breakpoint(self, line_number):
         if not self.is_valid_address(line_number):
             raise ValueError('Invalid address for a breakpoint')
@@ -0,0 +1,49 @@
+from bisect import bisect_right, insort
+from collections import namedtuple
+
+MemoryRegion = namedtuple('MemoryRegion', ['start', 'end', 'wait_states'])
+
+
+class TimingModel:
+    """Clock cycle costs of instructions and memory accesses
+
+    Every instruction costs a fixed number of cycles for its opcode, and every
+    bus access, instruction fetches included, adds the wait states of the
+    memory region it falls into. Regions are inclusive address ranges, and
+    accesses outside all of them get default_wait_states."""
+
+    def __init__(self, instruction_cycles, interrupt_cycles=1, default_wait_states=0):
+        self.instruction_cycles = dict(instruction_cycles)
+        self.interrupt_cycles = interrupt_cycles
+        self.default_wait_states = default_wait_states
+        self.regions = []
+        self.starts = []
+
+    def add_region(self, start, end, wait_states):
+        """Set the wait states of an inclusive address range, for example a slow external memory"""
+        if end < start:
+            raise ValueError('Invalid address range for a memory region')
+        for region in self.regions:
+            if start <= region.end and region.start <= end:
+                raise ValueError('Memory region overlaps an existing one')
+
+        region = MemoryRegion(start, end, wait_states)
+        insort(self.regions, region)
+        self.starts = [region.start for region in self.regions]
+        return region
+
+    def remove_region(self, region):
+        self.regions.remove(region)
+        self.starts = [region.start for region in self.regions]
+
+    def instruction_cost(self, opcode):
+        return self.instruction_cycles.get(opcode, 1)
+
+    def wait_states(self, address):
+        if not self.regions:
+            return self.default_wait_states
+
+        i = bisect_right(self.starts, address) - 1
+        if i >= 0 and address <= self.regions[i].end:
+            return self.regions[i].wait_states
+        return self.default_wait_states
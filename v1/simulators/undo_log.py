@@ -0,0 +1,124 @@
+from array import array
+from bisect import bisect_right
+
+
+class UndoChunk:
+    """A fixed number of undo records, kept in flat typed arrays
+
+    Every record stores the cycle counter and instruction address from before
+    the instruction, whether it interacted with devices or events, and a slice
+    of (kind, key, old value) deltas."""
+
+    def __init__(self):
+        self.starts = array('L')
+        self.cycles = array('Q')
+        self.addresses = array('q')
+        self.external = bytearray()
+        self.kinds = bytearray()
+        self.keys = array('L')
+        self.values = array('Q')
+
+    def __len__(self):
+        return len(self.starts)
+
+
+class UndoLog:
+    """Log of register, flag and memory deltas for every executed instruction
+
+    Records are held in chunks of chunk_size records, and full snapshots are
+    taken every checkpoint_interval records, so that any recorded position can
+    be reached by restoring a checkpoint and replaying a bounded number of
+    instructions."""
+
+    REGISTER, FLAG, MEMORY = 0, 1, 2
+
+    def __init__(self, register_names, flag_names, checkpoint_interval=10000, chunk_size=4096):
+        self.register_names = register_names
+        self.flag_names = flag_names
+        self.checkpoint_interval = checkpoint_interval
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.position = 0
+        self.checkpoint_positions = []
+        self.checkpoints = []
+
+    # Recording
+
+    def begin(self, cycle, address):
+        if not self.chunks or len(self.chunks[-1]) == self.chunk_size:
+            self.chunks.append(UndoChunk())
+
+        chunk = self.chunks[-1]
+        chunk.starts.append(len(chunk.kinds))
+        chunk.cycles.append(cycle)
+        chunk.addresses.append(address)
+        chunk.external.append(0)
+        self.position += 1
+
+    def add(self, kind, key, value):
+        chunk = self.chunks[-1]
+        chunk.kinds.append(kind)
+        chunk.keys.append(key)
+        chunk.values.append(value)
+
+    def mark_external(self):
+        self.chunks[-1].external[-1] = 1
+
+    def add_checkpoint(self, snapshot):
+        self.checkpoint_positions.append(self.position)
+        self.checkpoints.append(snapshot)
+
+    def needs_checkpoint(self):
+        return self.position - self.checkpoint_positions[-1] >= self.checkpoint_interval
+
+    # Undoing
+
+    def is_external(self):
+        """Test whether the last record can only be undone by replaying from a checkpoint"""
+        return self.chunks[-1].external[-1] == 1
+
+    def pop(self):
+        """Remove the last record, and return (cycle, address, deltas) with deltas in undo order"""
+        chunk = self.chunks[-1]
+        start = chunk.starts.pop()
+        record = (chunk.cycles.pop(), chunk.addresses.pop(),
+                  list(zip(reversed(chunk.kinds[start:]), reversed(chunk.keys[start:]), reversed(chunk.values[start:]))))
+
+        del chunk.external[-1]
+        del chunk.kinds[start:]
+        del chunk.keys[start:]
+        del chunk.values[start:]
+        if not len(chunk):
+            self.chunks.pop()
+        self.position -= 1
+
+        if self.checkpoint_positions[-1] > self.position:
+            self.checkpoint_positions.pop()
+            self.checkpoints.pop()
+        return record
+
+    def checkpoint_before(self, position):
+        """Return a (position, snapshot) pair for the last checkpoint not after position"""
+        i = bisect_right(self.checkpoint_positions, position) - 1
+        return self.checkpoint_positions[i], self.checkpoints[i]
+
+    def truncate(self, position):
+        """Drop all records and checkpoints after a given position"""
+        while self.position > position:
+            chunk = self.chunks[-1]
+            keep = max(len(chunk) - (self.position - position), 0)
+            if keep == 0:
+                self.position -= len(chunk)
+                self.chunks.pop()
+                continue
+
+            start = chunk.starts[keep]
+            for records in (chunk.starts, chunk.cycles, chunk.addresses, chunk.external):
+                del records[keep:]
+            for deltas in (chunk.kinds, chunk.keys, chunk.values):
+                del deltas[start:]
+            self.position = position
+
+        i = bisect_right(self.checkpoint_positions, position)
+        del self.checkpoint_positions[i:]
+        del self.checkpoints[i:]
@@ -0,0 +1,110 @@
+"""Startup time measurement for PEAS
+
+Reports how long importing every module takes, each measured in a fresh
+interpreter so that modules it shares with others are counted too, followed
+by the cost of constructing the objects the application builds. Modules
+which cannot be imported, such as the GUI ones without PyGObject installed,
+are reported as unavailable.
+
+Usage: python startup_time.py [--repeat N] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+
+MODULES = [
+    'utils.binary',
+    'utils.peg',
+    'utils.frisc_parsing',
+    'assemblers.frisc_assembler',
+    'simulators.simulator',
+    'simulators.frisc_simulator',
+    'gi.repository.Gtk',
+    'gui_components.editor_component',
+    'gui_components.simulator_component',
+    'application'
+]
+
+_IMPORT_SCRIPT = ('import sys, time; sys.path.insert(0, {!r}); start = time.perf_counter(); '
+                  'import {}; print(time.perf_counter() - start)')
+
+
+def measure_import(module, repeat):
+    """Return the best time of importing a module in a fresh interpreter, or None if it cannot be imported"""
+    times = []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, '-c', _IMPORT_SCRIPT.format(BASE_PATH, module)],
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+        if process.returncode != 0:
+            return None
+        times.append(float(process.stdout))
+    return min(times)
+
+
+def build_grammar():
+    from utils.frisc_parsing import parse_instruction, split_on_tokens
+    parse_instruction(split_on_tokens(' ADD R0, 1, R0'))
+
+
+def build_simulator():
+    from simulators.frisc_simulator import FRISCSimulator
+    FRISCSimulator(65536)
+
+
+def build_editor():
+    from gui_components.editor_component import EditorComponent
+    EditorComponent()
+
+
+def build_simulator_component():
+    from gui_components.simulator_component import SimulatorComponent
+    SimulatorComponent()
+
+
+CONSTRUCTIONS = [
+    ('grammar', build_grammar),
+    ('FRISCSimulator', build_simulator),
+    ('EditorComponent', build_editor),
+    ('SimulatorComponent', build_simulator_component)
+]
+
+
+def measure_construction(build):
+    """Return the time of a first construction, or None if it fails"""
+    start = time.perf_counter()
+    try:
+        build()
+    except Exception:
+        return None
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure PEAS import and construction times')
+    parser.add_argument('--repeat', type=int, default=3, help='number of fresh imports to take the best time of')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    arguments = parser.parse_args()
+
+    sys.path.insert(0, BASE_PATH)
+    results = {
+        'imports': {module: measure_import(module, arguments.repeat) for module in MODULES},
+        'constructions': {name: measure_construction(build) for name, build in CONSTRUCTIONS}
+    }
+
+    if arguments.json:
+        print(json.dumps(results, indent=4))
+        return
+
+    for section, times in results.items():
+        print(section.capitalize())
+        for name, seconds in times.items():
+            print('    {:<40}{}'.format(name, 'unavailable' if seconds is None else '{:8.2f} ms'.format(1000 * seconds)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import unittest
+
+import batch_runner
+
+from assemblers.frisc_assembler import FRISCAssembler
+
+PROGRAM = 'halt.a'
+
+SOURCE = """        ADD R7, 4, R1
+        HALT
+"""
+
+
+class RunEntryTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        batch_runner.set_listings({PROGRAM: FRISCAssembler.assemble_source(SOURCE).listing})
+
+    def run_entry(self, **entry):
+        return batch_runner.run_entry(dict(entry, id='case', program=PROGRAM))
+
+    def test_register_aliases(self):
+        result = self.run_entry(registers={'SP': '0x100'}, expected={'registers': {'SP': '0x100', 'R1': '0x104'}})
+        self.assertEqual(result['stop_reason'], 'halted')
+        self.assertTrue(result['passed'])
+        self.assertNotIn('SP', result['registers'])
+
+    def test_unknown_initial_register(self):
+        result = self.run_entry(registers={'R9': 1}, expected={'registers': {'R1': 4}})
+        self.assertEqual(result['stop_reason'], 'error')
+        self.assertIn('R9', result['error'])
+        self.assertFalse(result['passed'])
+        self.assertNotIn('R9', result['registers'])
+
+    def test_unknown_expected_register(self):
+        result = self.run_entry(expected={'registers': {'R9': 0}})
+        self.assertEqual(result['stop_reason'], 'halted')
+        self.assertIn('R9', result['error'])
+        self.assertFalse(result['passed'])
+
+    def test_expected_memory_outside_of_memory(self):
+        result = self.run_entry(expected={'memory': {'0x20000': [0]}})
+        self.assertEqual(result['stop_reason'], 'halted')
+        self.assertIn('error', result)
+        self.assertFalse(result['passed'])
+
+    def test_failing_entry_does_not_stop_the_batch(self):
+        entries = [dict(id=i, program=PROGRAM, expected={'registers': {name: 0}}) for i, name in enumerate(['R9', 'R0'])]
+        results = list(batch_runner.run_batch(entries, workers=1, listings={PROGRAM: batch_runner._listings[PROGRAM]}))
+        self.assertEqual([result['id'] for result in results], [0, 1])
+        self.assertFalse(results[0]['passed'])
+        self.assertTrue(results[1]['passed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,18 +2,37 @@ class BinaryNumber:
     """Binary number representation as a fixed width string, together with
     basic arithmetic operations on them.
 
+    Binary numbers are immutable, every operation returns a new number, so
+    they can be shared between memory, registers and traces without copying.
+    All Binary8 values and small Binary32 values are interned.
+
     NOTICE: Highest value bit is on the left, position 0"""
 
-    def __init__(self, int_value, width):
-        self.WIDTH = width
-        self.digits = list(('{:0>' + str(width) + 'b}').format(abs(int_value)))
-        self.flags = ()
+    __slots__ = ('WIDTH', 'digits', 'flags')
 
-        if len(self.digits) != self.WIDTH:
+    def __new__(cls, int_value, width):
+        if abs(int_value) >> width:
             raise ValueError('Integer too large to fit into a given number of bits.')
 
-        if int_value < 0:
-            self.digits = (-self).digits
+        return cls._make(tuple(('{:0>' + str(width) + 'b}').format(int_value & ((1 << width) - 1))))
+
+    @classmethod
+    def _make(cls, digits, flags=()):
+        """Create a number from a tuple of digits, bypassing interning"""
+        number = object.__new__(cls)
+        _set_width(number, len(digits))
+        _set_digits(number, digits)
+        _set_flags(number, flags)
+        return number
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Binary numbers are immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Binary numbers are immutable')
+
+    def __reduce__(self):
+        return _restore, (self.__class__, self.digits, self.flags)
 
     # Conversions and display functions
 
@@ -26,9 +45,7 @@ class BinaryNumber:
 
     @classmethod
     def from_digits(cls, digit_list):
-        number = cls(0, len(digit_list))
-        number.digits = digit_list
-        return number
+        return cls._make(tuple(digit_list))
 
     @classmethod
     def from_hex(cls, hex_string, width):
@@ -64,7 +81,7 @@ class BinaryNumber:
 
     def __neg__(self):
         """Two's complement of a given number"""
-        return self.__class__(2 ** self.WIDTH - int(self), self.WIDTH) if not self.is_zero() else self
+        return self.__class__(-int(self) % 2 ** self.WIDTH, self.WIDTH) if not self.is_zero() else self
 
     def __add__(self, x, c='0'):
         if isinstance(x, BinaryNumber):
@@ -75,10 +92,7 @@ class BinaryNumber:
             for i in range(self.WIDTH - 1, -1, -1):
                 sums[i], carries[i] = BinaryNumber._add2(self[i], x[i], carries[i + 1] if i < self.WIDTH - 1 else c)
 
-            result = self.__class__.from_digits(sums)
-            result.flags = carries[0], BinaryNumber._xor2(carries[0], carries[1]), result.is_negative(), result.is_zero()
-
-            return result
+            return self._result(sums, carries[0], BinaryNumber._xor2(carries[0], carries[1]))
 
         elif isinstance(x, int):
             return self + self.__class__(x, self.WIDTH)
@@ -94,10 +108,7 @@ class BinaryNumber:
             for i in range(self.WIDTH - 1, -1, -1):
                 sums[i], carries[i] = BinaryNumber._sub2(self[i], x[i], carries[i + 1] if i < self.WIDTH - 1 else c)
 
-            result = self.__class__.from_digits(sums)
-            result.flags = carries[0], BinaryNumber._xor2(carries[0], carries[1]), result.is_negative(), result.is_zero()
-
-            return result
+            return self._result(sums, carries[0], BinaryNumber._xor2(carries[0], carries[1]))
 
         elif isinstance(x, int):
             return self - self.__class__(x, self.WIDTH)
@@ -110,10 +121,7 @@ class BinaryNumber:
         if len(self) != len(x):
             raise TypeError('Incompatible binary numbers - different lengths')
 
-        result = self.__class__.from_digits(['1' if self[i] == '1' and x[i] == '1' else '0' for i in range(0, self.WIDTH)])
-        result.flags = '0', '0', result.is_negative(), result.is_zero()
-
-        return result
+        return self._result(['1' if self[i] == '1' and x[i] == '1' else '0' for i in range(0, self.WIDTH)], '0', '0')
 
     def __or__(self, x):
         if not isinstance(x, BinaryNumber):
@@ -121,10 +129,7 @@ class BinaryNumber:
         if len(self) != len(x):
             raise TypeError('Incompatible binary numbers - different lengths')
 
-        result = self.__class__.from_digits(['1' if self[i] == '1' or x[i] == '1' else '0' for i in range(0, self.WIDTH)])
-        result.flags = '0', '0', result.is_negative(), result.is_zero()
-
-        return result
+        return self._result(['1' if self[i] == '1' or x[i] == '1' else '0' for i in range(0, self.WIDTH)], '0', '0')
 
     def __xor__(self, x):
         if not isinstance(x, BinaryNumber):
@@ -132,10 +137,7 @@ class BinaryNumber:
         if len(self) != len(x):
             raise TypeError('Incompatible binary numbers - different lengths')
 
-        result = self.__class__.from_digits([str(int(self[i] != x[i])) for i in range(0, self.WIDTH)])
-        result.flags = '0', '0', result.is_negative(), result.is_zero()
-
-        return result
+        return self._result([str(int(self[i] != x[i])) for i in range(0, self.WIDTH)], '0', '0')
 
     def __lshift__(self, x):
         if not isinstance(x, BinaryNumber):
@@ -147,10 +149,8 @@ class BinaryNumber:
         if int_x < 0:
             return self >> (-x)
 
-        result = self.__class__.from_digits(self[int_x:] + ['0'] * int_x if int_x < self.WIDTH else ['0'] * self.WIDTH)
-        result.flags = x[int_x - 1] if int_x > 0 and int_x <= self.WIDTH else '0', '0', result.is_negative(), result.is_zero()
-
-        return result
+        return self._result(self[int_x:] + ('0',) * int_x if int_x < self.WIDTH else ('0',) * self.WIDTH,
+                            self[int_x - 1] if int_x > 0 and int_x <= self.WIDTH else '0', '0')
 
     def __rshift__(self, x):
         """Logical shift right"""
@@ -163,10 +163,8 @@ class BinaryNumber:
         if int_x < 0:
             return self << (-x)
 
-        result = self.__class__.from_digits(['0'] * int_x + x[: -int_x] if int_x < self.WIDTH else ['0'] * self.WIDTH)
-        result.flags = x[-int_x] if int_x > 0 and int_x <= self.WIDTH else '0', '0', result.is_negative(), result.is_zero()
-
-        return result
+        return self._result(('0',) * int_x + self[: self.WIDTH - int_x] if int_x < self.WIDTH else ('0',) * self.WIDTH,
+                            self[-int_x] if int_x > 0 and int_x <= self.WIDTH else '0', '0')
 
     def arshift(self, x):
         """Arithmetic shift right"""
@@ -179,10 +177,8 @@ class BinaryNumber:
         if int_x < 0:
             return self << (-x)
 
-        result = self.__class__.from_digits([self[0]] * int_x + self[: -int_x] if int_x < self.WIDTH else [self[0]] * self.WIDTH)
-        result.flags = x[-int_x] if int_x > 0 and int_x <= self.WIDTH else '0', '0', result.is_negative(), result.is_zero()
-
-        return result
+        return self._result((self[0],) * int_x + self[: self.WIDTH - int_x] if int_x < self.WIDTH else (self[0],) * self.WIDTH,
+                            self[-int_x] if int_x > 0 and int_x <= self.WIDTH else '0', '0')
 
     def rotl(self, x):
         """Right rotation"""
@@ -195,10 +191,7 @@ class BinaryNumber:
         if int_x < 0:
             return self.rotr(-x)
 
-        result = self.__class__.from_digits(self[int_x:] + self[: int_x])
-        result.flags = self[int_x - 1], '0', self.is_negative(), self.is_zero()
-
-        return result
+        return self.__class__._make(self[int_x:] + self[: int_x], (self[int_x - 1], '0', self.is_negative(), self.is_zero()))
 
     def rotr(self, x):
         """Left rotation"""
@@ -211,10 +204,7 @@ class BinaryNumber:
         if int_x < 0:
             return self.rotl(x)
 
-        result = self.__class__.from_digits(self[-int_x:] + self[: -int_x])
-        result.flags = self[-int_x], '0', self.is_negative(), self.is_zero()
-
-        return result
+        return self.__class__._make(self[-int_x:] + self[: -int_x], (self[-int_x], '0', self.is_negative(), self.is_zero()))
 
     def adc(self, x, c):
         return self.__add__(x, c)
@@ -230,9 +220,6 @@ class BinaryNumber:
     def __getitem__(self, key):
         return self.digits[key]
 
-    def __setitem__(self, key, value):
-        self.digits[key] = value
-
     def __floordiv__(self, x):
         """Define // operator to concatenate two binary numbers into a larger one"""
         return BinaryNumber.from_digits(self.digits + x.digits)
@@ -243,16 +230,22 @@ class BinaryNumber:
         return self.flags[0], self.flags[1], '1' if self.flags[2] else '0', '1' if self.flags[3] else '0'
 
     def clear_flags(self):
-        self.flags = ()
+        """Return the same number without flags"""
+        return self.__class__.from_digits(self.digits)
 
     def is_zero(self):
-        return len(list(filter(lambda x: x == '1', self.digits))) == 0
+        return '1' not in self.digits
 
     def is_negative(self):
         return self.digits[0] == '1'
 
     # Private helper functions
 
+    def _result(self, digits, carry, overflow):
+        """Create the result of an operation, flagged with carry, overflow, negative and zero"""
+        digits = tuple(digits)
+        return self.__class__._make(digits, (carry, overflow, digits[0] == '1', '1' not in digits))
+
     @staticmethod
     def _add2(a, b, c):
         z = int(a, 2) + int(b, 2) + int(c, 2)
@@ -271,21 +264,24 @@ class BinaryNumber:
 class Binary8(BinaryNumber):
     """8-bit binary number representation"""
 
-    def __init__(self, int_value, width=8):
-        super().__init__(int_value, 8)
+    __slots__ = ()
+
+    def __new__(cls, int_value, width=8):
+        if cls is Binary8 and -256 < int_value < 256:
+            return _byte_values[int_value & 0xFF]
+        return BinaryNumber.__new__(cls, int_value, 8)
 
     @classmethod
     def from_digits(cls, digits_list, signed=False):
         if len(digits_list) > 8:
             raise ValueError('Too many digits given, cannot fit into 8 bits.')
 
-        number = cls(0)
-        number.digits = ([digits_list[0]] if signed else ['0']) * (8 - len(digits_list)) + digits_list
-        return number
+        digits = ((digits_list[0],) if signed else ('0',)) * (8 - len(digits_list)) + tuple(digits_list)
+        return _bytes[digits] if cls is Binary8 else cls._make(digits)
 
     @classmethod
     def from_hex(cls, hex_string):
-        return BinaryNumber.from_hex(hex_string, 8)
+        return cls(int(hex_string, 16))
 
     @classmethod
     def __instancecheck__(self, other):
@@ -295,21 +291,21 @@ class Binary8(BinaryNumber):
 class Binary16(BinaryNumber):
     """16-bit binary number representation"""
 
-    def __init__(self, int_value, width=16):
-        super().__init__(int_value, 16)
+    __slots__ = ()
+
+    def __new__(cls, int_value, width=16):
+        return BinaryNumber.__new__(cls, int_value, 16)
 
     @classmethod
     def from_digits(cls, digits_list, signed=False):
         if len(digits_list) > 16:
             raise ValueError('Too many digits given, cannot fit into 16 bits.')
 
-        number = cls(0)
-        number.digits = ([digits_list[0]] if signed else ['0']) * (16 - len(digits_list)) + digits_list
-        return number
+        return cls._make(((digits_list[0],) if signed else ('0',)) * (16 - len(digits_list)) + tuple(digits_list))
 
     @classmethod
     def from_hex(cls, hex_string):
-        return BinaryNumber.from_hex(hex_string, 16)
+        return cls(int(hex_string, 16))
 
     @classmethod
     def __instancecheck__(self, other):
@@ -319,18 +315,43 @@ class Binary16(BinaryNumber):
 class Binary32(BinaryNumber):
     """32-bit binary number representation"""
 
-    def __init__(self, int_value, width=32):
-        super().__init__(int_value, 32)
+    __slots__ = ()
+
+    def __new__(cls, int_value, width=32):
+        if cls is Binary32 and _SMALL_WORDS_START <= int_value < _SMALL_WORDS_END:
+            return _small_words[int_value - _SMALL_WORDS_START]
+        return BinaryNumber.__new__(cls, int_value, 32)
 
     @classmethod
     def from_digits(cls, digits_list, signed=False):
         if len(digits_list) > 32:
             print(digits_list, len(digits_list))
             raise ValueError('Too many digits given, cannot fit into 32 bits.')
-        number = cls(0)
-        number.digits = ([digits_list[0]] if signed else ['0']) * (32 - len(digits_list)) + digits_list
-        return number
+        digits = ((digits_list[0],) if signed else ('0',)) * (32 - len(digits_list)) + tuple(digits_list)
+        if cls is Binary32:
+            number = _words.get(digits)
+            if number is not None:
+                return number
+        return cls._make(digits)
 
     @classmethod
     def __instancecheck__(self, other):
         return other.WIDTH == 32 if isinstance(other, BinaryNumber) else False
+
+
+_set_width = BinaryNumber.WIDTH.__set__
+_set_digits = BinaryNumber.digits.__set__
+_set_flags = BinaryNumber.flags.__set__
+
+
+def _restore(cls, digits, flags):
+    """Unpickle a binary number, interning it unless it has flags"""
+    return cls._make(digits, flags) if flags else cls.from_digits(digits)
+
+
+_byte_values = tuple(BinaryNumber.__new__(Binary8, i, 8) for i in range(256))
+_bytes = {number.digits: number for number in _byte_values}
+
+_SMALL_WORDS_START, _SMALL_WORDS_END = -128, 1024     # Registers mostly hold small counters, offsets and addresses
+_small_words = tuple(BinaryNumber.__new__(Binary32, i, 32) for i in range(_SMALL_WORDS_START, _SMALL_WORDS_END))
+_words = {number.digits: number for number in _small_words}
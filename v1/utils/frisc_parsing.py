@@ -34,23 +34,33 @@ class Hexadecimal(Integer):
 
 
 class BinaryGroup(Sequence):
-    items = Forgetable(Token(pattern='%B')), Binary()
+    @lazy_items
+    def items():
+        return Forgetable(Token(pattern='%B')), Binary()
 
 
 class OctalGroup(Sequence):
-    items = Forgetable(Token(pattern='%O')), Octal()
+    @lazy_items
+    def items():
+        return Forgetable(Token(pattern='%O')), Octal()
 
 
 class DecimalGroup(Sequence):
-    items = Forgetable(Token(pattern='%D')), Decimal()
+    @lazy_items
+    def items():
+        return Forgetable(Token(pattern='%D')), Decimal()
 
 
 class HexadecimalGroup(Sequence):
-    items = Optional(Forgetable(Token(pattern='%H'))), Hexadecimal()
+    @lazy_items
+    def items():
+        return Optional(Forgetable(Token(pattern='%H'))), Hexadecimal()
 
 
 class Numeric(Or):
-    items = BinaryGroup(), OctalGroup(), DecimalGroup(), HexadecimalGroup()
+    @lazy_items
+    def items():
+        return BinaryGroup(), OctalGroup(), DecimalGroup(), HexadecimalGroup()
 
 
 class Sign(Token):
@@ -84,7 +94,9 @@ class Label(Token):
 
 
 class Constant(Or):
-    items = Label(), Numeric()
+    @lazy_items
+    def items():
+        return Label(), Numeric()
 
 
 class GeneralRegister(Token):
@@ -102,7 +114,9 @@ class StatusRegister(Token):
 
 
 class Register(Or):
-    items = GeneralRegister(), StatusRegister()
+    @lazy_items
+    def items():
+        return GeneralRegister(), StatusRegister()
 
 
 class Condition(Token):
@@ -157,7 +171,9 @@ class Instruction(Group):
 
 
 class ALInstr(Instruction):
-    items = ALInstrName(), GeneralRegister(), Comma(), Or(GeneralRegister(), Constant()), Optional(Sequence(Comma(), GeneralRegister()))
+    @lazy_items
+    def items():
+        return ALInstrName(), GeneralRegister(), Comma(), Or(GeneralRegister(), Constant()), Optional(Sequence(Comma(), GeneralRegister()))
 
     def encode(self, constants=None, line_number=None, **kwargs):
         return [self._opcodes[self[0].contents] +
@@ -177,16 +193,17 @@ class ALInstr(Instruction):
 
 
 class MemInstr(Instruction):
-    items = (MemInstrName(), GeneralRegister(), Comma(), LParens(), Or(Sequence(GeneralRegister(), Sign(), Numeric()),
-             GeneralRegister(), Constant()), RParens())
+    @lazy_items
+    def items():
+        return (MemInstrName(), GeneralRegister(), Comma(), LParens(), Or(Sequence(GeneralRegister(), Sign(), Numeric()),
+                GeneralRegister(), Constant()), RParens())
 
     def encode(self, constants=None, line_number=None, **kwargs):
-        return [self._opcodes[self[0].contents] +
-                ('1' if isinstance(self[4], Integer) else '0') +
-                self[1].encode() +
-                (self[4].encode() if isinstance(self[4], GeneralRegister) else '000') +
-                (self[6].encode() if len(self) > 6 else self[4].encode(constants))
-                ]
+        if isinstance(self[4], GeneralRegister):
+            offset = (-int(self[6]) if self[5].contents == '-' else int(self[6])) if len(self) > 6 else 0
+            return [self._opcodes[self[0].contents] + '1' + self[1].encode() + self[4].encode() + str(BinaryNumber(offset, 20))]
+
+        return [self._opcodes[self[0].contents] + '0' + self[1].encode() + '000' + self[4].encode(constants)]
 
     _opcodes = {
         'LOADB': '10010', 'STOREB': '10011', 'LOADH': '10100',
@@ -195,10 +212,12 @@ class MemInstr(Instruction):
 
 
 class StackInstr(Instruction):
-    items = StackInstrName(), GeneralRegister()
+    @lazy_items
+    def items():
+        return StackInstrName(), GeneralRegister()
 
     def encode(self, constants=None, line_number=None, **kwargs):
-        return [self._opcodes[self[0].content] +
+        return [self._opcodes[self[0].contents] +
                 '0' +
                 self[1].encode() +
                 '0' * 23
@@ -208,25 +227,29 @@ class StackInstr(Instruction):
 
 
 class MoveInstr(Instruction):
-    items = Token(pattern='MOVE'), Or(Register(), Constant()), Comma(), Register()
+    @lazy_items
+    def items():
+        return Token(pattern='MOVE'), Or(Register(), Constant()), Comma(), Register()
 
     def encode(self, constants=None, line_number=None, **kwargs):
         return ['00000' +
-                ('1' if isinstance(self[1], Integer) else '0') +
+                ('1' if isinstance(self[1], Integer) or isinstance(self[1], Label) else '0') +
                 self[3].encode() +
                 '0' +
-                ('1' if isinstance(self[1], StatusRegister) else '0') +
                 ('1' if isinstance(self[3], StatusRegister) else '0') +
+                ('1' if isinstance(self[1], StatusRegister) else '0') +
                 self[1].encode(constants=constants) +
                 ('' if isinstance(self[1], Integer) or isinstance(self[1], Label) else ('0' * 17))
                 ]
 
 
 class JumpInstr(Instruction):
-    items = JumpInstrName(), Optional(Sequence(Underscore(), Condition())), Or(Constant(), Sequence(LParens(), GeneralRegister(), RParens()))
+    @lazy_items
+    def items():
+        return JumpInstrName(), Optional(Sequence(Underscore(), Condition())), Or(Constant(), Sequence(LParens(), GeneralRegister(), RParens()))
 
     def encode(self, constants=None, line_number=None, **kwargs):
-        has_condition = Constant in [type(x) for x in self.contents]
+        has_condition = Condition in [type(x) for x in self.contents]
         i = 3 if has_condition else 1
         address = self[i + 1] if isinstance(self[i], LParens) else self[i]
         return [self._opcodes[self[0].contents] +
@@ -241,13 +264,15 @@ class JumpInstr(Instruction):
 
 
 class JRInstr(Instruction):
-    items = Token(pattern='JR'), Optional(Sequence(Underscore(), Condition())), Constant()
+    @lazy_items
+    def items():
+        return Token(pattern='JR'), Optional(Sequence(Underscore(), Condition())), Constant()
 
     def encode(self, constants=None, line_number=None, **kwargs):
-        has_condition = Constant in [type(x) for x in self.contents]
+        has_condition = Condition in [type(x) for x in self.contents]
         i = 3 if has_condition else 1
-        address = self[i].encode() - (line_number + 4 if isinstance(self[i], Label) else 0)
-        return ['11000' +
+        address = constants[self[i].contents] - (line_number + 4) if isinstance(self[i], Label) else int(self[i])
+        return ['11010' +
                 '1' +
                 (self[2].encode() if has_condition else '0000') +
                 '00' +
@@ -256,12 +281,14 @@ class JRInstr(Instruction):
 
 
 class RetInstr(Instruction):
-    items = RetInstrName(), Optional(Sequence(Underscore(), Condition()))
+    @lazy_items
+    def items():
+        return RetInstrName(), Optional(Sequence(Underscore(), Condition()))
 
     def encode(self, constants=None, line_number=None, **kwargs):
         return [self._opcodes[self[0].contents] +
                 '0' +
-                (self.content[2].encode() if len(self) > 1 else '0000') +
+                (self[2].encode() if len(self) > 1 else '0000') +
                 '0' * 20 +
                 self._types[self[0].contents]
                 ]
@@ -271,19 +298,27 @@ class RetInstr(Instruction):
 
 
 class OrgPseudoInstr(Instruction):
-    items = Token(pattern='ORG'), Numeric()
+    @lazy_items
+    def items():
+        return Token(pattern='ORG'), Numeric()
 
 
 class EquPseudoInstr(Instruction):
-    items = Token(pattern='EQU'), Numeric()
+    @lazy_items
+    def items():
+        return Token(pattern='EQU'), Numeric()
 
 
 class SpacePseudoInstr(Instruction):
-    items = Token(pattern='DS'), Numeric()
+    @lazy_items
+    def items():
+        return Token(pattern='DS'), Numeric()
 
 
 class DataPseudoInstr(Instruction):
-    items = DataPseudoInstrName(), Numeric(), Multiple(Sequence(Comma(), Numeric()))
+    @lazy_items
+    def items():
+        return DataPseudoInstrName(), Numeric(), Multiple(Sequence(Comma(), Numeric()))
 
     def encode(self, constants=None, line_number=None, **kwargs):
         values = ''.join([str(BinaryNumber(int(x), self._data_size[self[0].contents]))
@@ -295,7 +330,9 @@ class DataPseudoInstr(Instruction):
 
 
 class FRISCInstr(Or):
-    items = ALInstr(), MemInstr(), MoveInstr(), StackInstr(), JumpInstr(), JRInstr(), RetInstr(), OrgPseudoInstr(), EquPseudoInstr(), SpacePseudoInstr(), DataPseudoInstr()
+    @lazy_items
+    def items():
+        return ALInstr(), MemInstr(), MoveInstr(), StackInstr(), JumpInstr(), JRInstr(), RetInstr(), OrgPseudoInstr(), EquPseudoInstr(), SpacePseudoInstr(), DataPseudoInstr()
 
 
 def parse_instruction(arguments):
@@ -306,7 +343,7 @@ def parse_instruction(arguments):
 
 
 def split_on_tokens(line):
-    tokens = [x for x in re.split('\s|(,)|(\()|(\))|(?<!\s)(\+)|(?<!\s)(\-)', line) if x]
+    tokens = [x for x in re.split('\s|(,)|(\()|(\))|(?<![\s(])(\+)|(?<![\s(])(\-)', line) if x]
     return re.split('(_)', tokens[0], maxsplit=1) + tail(tokens) if len(tokens) > 0 else []
 
 
@@ -47,6 +47,21 @@ class Modifier(Item):
         return '{}: {}'.format(self.__class__.__name__, self.item)
 
 
+class lazy_items:
+    """Decorator for a combinator's items, building them on first use instead of at import
+
+    The built items replace the decorator on the class, so later accesses are
+    ordinary attribute lookups."""
+
+    def __init__(self, build):
+        self.build = build
+
+    def __get__(self, instance, owner):
+        items = tuple(self.build())
+        setattr(owner, 'items', items)
+        return items
+
+
 class Combinator(Item):
     items = ()
 